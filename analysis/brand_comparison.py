@@ -1,15 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from utils.filters import category_mask
 
 def brand_comparison_analysis(data, selected_brands):
     st.subheader("Brand vs. Brand Comparison Analysis")
 
     # Filter data for selected brands
-    filtered_data = data[data['brandName'].isin(selected_brands)]
+    filtered_data = data[category_mask(data['brandName'], selected_brands)]
 
     # Group by brandName and calculate total sales
-    brand_comparison = (filtered_data.groupby('brandName')['sellingPrice']
+    brand_comparison = (filtered_data['sellingPrice'].astype('float64')
+                        .groupby(filtered_data['brandName'], observed=True)
                         .sum()
                         .sort_values(ascending=False)
                         .reset_index())
@@ -1,52 +1,41 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from analysis.tables import brand_performance_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, PERCENT, show_table
 
-def brand_performance_analysis(filtered_data, selected_brands, selected_stores):
+def brand_performance_analysis(aggregates, selected_brands, selected_stores):
     st.markdown("<h1 style='text-align: center; color: green;'>Brand Performance Analysis</h1>", unsafe_allow_html=True)
 
-    # Calculate total selling and cost prices for the filtered data
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
+    # Per-brand totals, profit and contributions for the selected brands and stores
+    with timed('compute'):
+        aggregated_data = cached_tables(lambda: brand_performance_table(aggregates, selected_brands, selected_stores))
 
-    # Calculate overall total sales and profit based on the filtered data
-    overall_total_selling_price = filtered_data['total_selling_price'].sum()
-    overall_total_cost_price = filtered_data['total_cost_price'].sum()
-    overall_profit = overall_total_selling_price - overall_total_cost_price
+    # Chart and its controls rerun on their own when a control changes
+    render_brand_performance_chart(aggregated_data)
 
-    # Filter data for selected brands and stores
-    filtered_data = filtered_data[filtered_data['brandName'].isin(selected_brands) & filtered_data['storeName'].isin(selected_stores)]
-
-    # Aggregate the data based on each unique brandName
-    aggregated_data = (
-        filtered_data.groupby('brandName', as_index=False)
-        .agg(
-            total_selling_price=('total_selling_price', 'sum'),
-            total_cost_price=('total_cost_price', 'sum'),
-            total_quantity=('quantity', 'sum'),
-            category_count=('categoryName', 'nunique')
-        )
-        .sort_values(by='total_selling_price', ascending=False)
-    )
-    
-    # Calculate profit and add it to the aggregated data
-    aggregated_data['profit'] = aggregated_data['total_selling_price'] - aggregated_data['total_cost_price']
-    
-    # Calculate profit margin and format it as a percentage
-    aggregated_data['profit_margin'] = (aggregated_data['profit'] / aggregated_data['total_selling_price']) * 100
-    aggregated_data['profit_margin'] = aggregated_data['profit_margin'].apply(lambda x: f"{x:.2f}%")
+    st.markdown("<h4 style='text-align: center; color: green;'>Selected Brand Dataframe</h4>", unsafe_allow_html=True)
 
-    # Calculate contribution percentages based on overall totals
-    aggregated_data['sales_contribution'] = (aggregated_data['total_selling_price'] / overall_total_selling_price) * 100
-    aggregated_data['profit_contribution'] = (aggregated_data['profit'] / overall_profit) * 100
-    
-    # Format contribution percentages for better readability
-    aggregated_data['sales_contribution'] = aggregated_data['sales_contribution'].apply(lambda x: f"{x:.2f}%")
-    aggregated_data['profit_contribution'] = aggregated_data['profit_contribution'].apply(lambda x: f"{x:.2f}%")
+    # Display the aggregated data with contribution percentages
+    show_table(aggregated_data, key="brand_performance_table", formats={
+        'total_selling_price': MONEY,
+        'total_cost_price': MONEY,
+        'profit': MONEY,
+        'profit_margin': PERCENT,
+        'sales_contribution': PERCENT,
+        'profit_contribution': PERCENT,
+    })
 
-    # Chart options for customization in the sidebar
-    chart_type = st.sidebar.selectbox("Select Chart Type", ["Bar Chart", "Line Chart", "Area Chart"], key="chart_type_selector")
-    show_data_labels = st.sidebar.checkbox("Show Data Labels", value=False, key="show_data_labels_checkbox")
+@st.fragment
+def render_brand_performance_chart(aggregated_data):
+    # Chart options for customization above the chart
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.selectbox("Select Chart Type", ["Bar Chart", "Line Chart", "Area Chart"], key="chart_type_selector")
+    with col2:
+        show_data_labels = st.checkbox("Show Data Labels", value=False, key="show_data_labels_checkbox")
 
     # Generate the Plotly chart based on selected options
     if chart_type == "Bar Chart":
@@ -92,9 +81,4 @@ def brand_performance_analysis(filtered_data, selected_brands, selected_stores):
     )
 
     # Display the Plotly chart in Streamlit
-    st.plotly_chart(fig, use_container_width=True)
-
-    st.markdown("<h4 style='text-align: center; color: green;'>Selected Brand Dataframe</h4>", unsafe_allow_html=True)
-
-    # Display the aggregated data with contribution percentages
-    st.write(aggregated_data)
+    plotly_chart(fig, use_container_width=True)
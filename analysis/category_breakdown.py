@@ -1,59 +1,49 @@
 import streamlit as st
 import plotly.express as px
+from analysis.tables import category_breakdown_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, PERCENT, show_table
 
 def category_breakdown_analysis(data, selected_brands):
     st.markdown("<h1 style='text-align: center; color: green;'>Category Breakdown</h1>", unsafe_allow_html=True)
     
-    # Strip extra spaces from categoryName and brandName to ensure consistency
-    data['categoryName'] = data['categoryName'].str.strip()
-    data['brandName'] = data['brandName'].str.strip()
-
-    # Filter data for selected brands
-    filtered_data = data[data['brandName'].isin(selected_brands)]
+    # Sales, cost, quantity and profit by category for the selected brands
+    with timed('compute'):
+        category_sales = cached_tables(lambda: category_breakdown_table(data, selected_brands))
 
     # Check if filtered data is empty
-    if filtered_data.empty:
+    if category_sales.empty:
         st.warning("No data found for the selected brands and categories.")
         return
 
-    # Calculate sales and cost by category
-    filtered_data['total_sales'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost'] = filtered_data['costPrice'] * filtered_data['quantity']
-
-    # Aggregate total_sales, total_cost, and quantity by categoryName
-    category_sales = filtered_data.groupby('categoryName').agg(
-        total_sales=('total_sales', 'sum'),
-        total_cost=('total_cost', 'sum'),
-        total_quantity=('quantity', 'sum')
-    ).reset_index()
-
-    # Calculate profit and profit margin
-    category_sales['profit'] = category_sales['total_sales'] - category_sales['total_cost']
-    category_sales['profit_margin'] = ((category_sales['profit'] / category_sales['total_sales']) * 100).round(2)
-
-    # Format profit margin as a percentage
-    category_sales['profit_margin'] = category_sales['profit_margin'].astype(str) + '%'
+    # Display data table with the profit margin shown as a percentage
+    show_table(category_sales, key="category_breakdown_table", formats={
+        'total_sales': MONEY,
+        'total_cost': MONEY,
+        'profit': MONEY,
+        'profit_margin': PERCENT,
+    })
 
-    # Sort the dataframe by total_sales in descending order
-    category_sales = category_sales.sort_values(by='total_sales', ascending=False)
+    # Chart and its controls rerun on their own when a control changes
+    render_category_breakdown_chart(category_sales)
 
-    # Display data table
-    st.dataframe(category_sales)
-
-    # Sidebar options for chart customization
-    st.sidebar.subheader("Category Breakdown Chart Settings")
-    
-    chart_type = st.sidebar.selectbox(
-        "Select Chart Type", 
-        ["Bar Chart", "Pie Chart", "Treemap"], 
-        key="category_breakdown_chart_type"
-    )
-    
-    show_data_labels = st.sidebar.checkbox(
-        "Show Data Labels", 
-        False, 
-        key="category_breakdown_show_data_labels"
-    )
+@st.fragment
+def render_category_breakdown_chart(category_sales):
+    # Options for chart customization above the chart
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.selectbox(
+            "Select Chart Type", 
+            ["Bar Chart", "Pie Chart", "Treemap"], 
+            key="category_breakdown_chart_type"
+        )
+    with col2:
+        show_data_labels = st.checkbox(
+            "Show Data Labels", 
+            False, 
+            key="category_breakdown_show_data_labels"
+        )
 
     # Define a color palette for the charts
     color_palette = px.colors.qualitative.Set3  # You can change this to another Plotly color palette
@@ -73,4 +63,4 @@ def category_breakdown_analysis(data, selected_brands):
         fig = px.treemap(category_sales, path=['categoryName'], values='total_sales', 
                          title="Category Breakdown by Sales", color='categoryName', color_discrete_sequence=color_palette)
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
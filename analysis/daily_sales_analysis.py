@@ -1,53 +1,29 @@
 import pandas as pd
 import plotly.express as px
 import streamlit as st
+from analysis.tables import daily_sales_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, show_table
+from utils.chart_data import date_axis, default_chart_index, heatmap_figure, line_render_mode, reduce_chart_frame
 
 def daily_sales_analysis(filtered_data, selected_brands, selected_stores):
     st.markdown("<h1 style='text-align: center; color: green;'>Daily Sales</h1>", unsafe_allow_html=True)
     
-    # Filter data based on selected brands
-    daily_sales_data = filtered_data[filtered_data['brandName'].isin(selected_brands)]
-    
-    # Aggregate daily sales for each brand
-    daily_sales_data['orderDate'] = pd.to_datetime(daily_sales_data['orderDate'])
-    daily_sales = daily_sales_data.groupby([daily_sales_data['orderDate'].dt.date, 'brandName']).agg(
-        total_sales=('sellingPrice', lambda x: (x * daily_sales_data.loc[x.index, 'quantity']).sum()),
-        total_quantity=('quantity', 'sum'),
-        total_cost=('costPrice', lambda x: (x * daily_sales_data.loc[x.index, 'quantity']).sum())
-    ).reset_index()
-
-    # Add profit calculation: total sales minus total cost
-    daily_sales['profit'] = daily_sales['total_sales'] - daily_sales['total_cost']
-
-    # Create a chart of daily sales
-    chart_type = st.selectbox("Select chart type for Daily Sales", ["Line Chart", "Bar Chart", "Area Chart", "Donut Chart"])
-    
-    # Color palette for diverse and vibrant charts
-    color_palette = px.colors.qualitative.Set2 
-
-    if chart_type == "Line Chart":
-        fig = px.line(daily_sales, x='orderDate', y='total_sales', color='brandName', title="Daily Sales", color_discrete_sequence=color_palette)
-    elif chart_type == "Bar Chart":
-        fig = px.bar(daily_sales, x='orderDate', y='total_sales', color='brandName', title="Daily Sales", color_discrete_sequence=color_palette)
-    elif chart_type == "Area Chart":
-        fig = px.area(daily_sales, x='orderDate', y='total_sales', color='brandName', title="Daily Sales", color_discrete_sequence=color_palette)
-    elif chart_type == "Donut Chart":
-        fig = px.pie(daily_sales, names='brandName', values='total_sales', title="Total Daily Sales per Brand", hole=0.3, color_discrete_sequence=color_palette)
+    # Daily sales, quantity, cost and profit for each selected brand
+    with timed('compute'):
+        daily_sales = cached_tables(lambda: daily_sales_table(filtered_data, selected_brands))
 
-    # Update x-axis to show all dates without intervals
-    fig.update_layout(
-        xaxis=dict(
-            tickmode='linear',  # Ensure dates are displayed linearly without intervals
-            dtick="D1",  # Display every single day
-            tickformat="%Y-%m-%d",  # Format the date in Year-Month-Day format
-        )
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # Chart and its controls rerun on their own when a control changes
+    render_daily_sales_chart(daily_sales)
     
 
     # Display DataFrame summary
-    st.dataframe(daily_sales)
+    show_table(daily_sales, key="daily_sales_table", formats={
+        'total_sales': MONEY,
+        'total_cost': MONEY,
+        'profit': MONEY,
+    })
 
     # Calculate metrics
     total_sales = daily_sales['total_sales'].sum()
@@ -64,3 +40,39 @@ def daily_sales_analysis(filtered_data, selected_brands, selected_stores):
         st.metric("Total Quantity Sold", f"{total_quantity:,.0f}")
     with col3:
         st.metric("Total Profit", f"₹{total_profit:,.2f}", delta=f"▲ ₹{total_profit - daily_sales['profit'].mean():,.2f}", delta_color="normal")
+
+@st.fragment
+def render_daily_sales_chart(daily_sales):
+    # Create a chart of daily sales
+    chart_types = ["Line Chart", "Bar Chart", "Area Chart", "Donut Chart", "Heatmap"]
+    chart_type = st.selectbox("Select chart type for Daily Sales", chart_types,
+                              index=default_chart_index(chart_types, daily_sales['brandName'].nunique()), key="daily_sales_chart_type")
+    
+    # Color palette for diverse and vibrant charts
+    color_palette = px.colors.qualitative.Set2 
+
+    # Largest brands plus an "Others" trace, thinned to the chart point cap
+    daily_data = daily_sales[['orderDate', 'brandName', 'total_sales']].assign(orderDate=pd.to_datetime(daily_sales['orderDate']))
+    if chart_type == "Donut Chart":
+        chart_data = reduce_chart_frame(daily_data, None, 'total_sales', 'brandName')
+    else:
+        chart_data = reduce_chart_frame(daily_data, 'orderDate', 'total_sales', 'brandName')
+
+    if chart_type == "Heatmap":
+        # Every brand as a row of the brand x day grid in a single trace
+        fig = heatmap_figure(daily_data, 'orderDate', 'total_sales', 'brandName', title="Daily Sales",
+                             labels={'x': 'Date', 'y': 'Brand', 'color': 'Sales'})
+    elif chart_type == "Line Chart":
+        fig = px.line(chart_data, x='orderDate', y='total_sales', color='brandName', title="Daily Sales",
+                      render_mode=line_render_mode(chart_data), color_discrete_sequence=color_palette)
+    elif chart_type == "Bar Chart":
+        fig = px.bar(chart_data, x='orderDate', y='total_sales', color='brandName', title="Daily Sales", color_discrete_sequence=color_palette)
+    elif chart_type == "Area Chart":
+        fig = px.area(chart_data, x='orderDate', y='total_sales', color='brandName', title="Daily Sales", color_discrete_sequence=color_palette)
+    elif chart_type == "Donut Chart":
+        fig = px.pie(chart_data, names='brandName', values='total_sales', title="Total Daily Sales per Brand", hole=0.3, color_discrete_sequence=color_palette)
+
+    # Date ticks every day for short ranges, spaced out for long ones
+    fig.update_layout(xaxis=date_axis(daily_sales['orderDate']))
+    
+    plotly_chart(fig, use_container_width=True)
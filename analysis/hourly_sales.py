@@ -1,101 +1,118 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from analysis.tables import hourly_sales_tables
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, show_table
+from utils.chart_data import default_chart_index, grid_heatmap_figure, line_render_mode, reduce_chart_frame
 
 def hourly_sales_analysis(data, selected_brands):
     st.markdown("<h1 style='text-align: center; color: green;'>Hourly Sales</h1>", unsafe_allow_html=True)
 
-    # Filter data for selected brands from main.py input
-    filtered_data = data[data['brandName'].isin(selected_brands)]
-    
-    # Extract hour from the time column and calculate total selling price and cost price
-    filtered_data['hour'] = filtered_data['time'].apply(lambda x: x.hour if pd.notnull(x) else None)
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
-    
-    # Aggregating sales by each hour (creating 24 columns for each hour)
-    hourly_sales = filtered_data.pivot_table(
-        index='brandName', 
-        columns='hour', 
-        values='total_selling_price', 
-        aggfunc='sum', 
-        fill_value=0
-    ).reset_index()
+    # Brand x hour pivot (24 columns for each hour) and the hourly totals for the selected brands
+    with timed('compute'):
+        tables = cached_tables(lambda: hourly_sales_tables(data, selected_brands))
+    hourly_sales = tables['hourly_sales']
 
     # Display brand-wise data table (with 24 columns representing each hour)
-    st.dataframe(hourly_sales)
+    show_table(hourly_sales, key="hourly_sales_table")
 
-    # Sidebar options for brand-wise chart
-    st.sidebar.subheader("Brand-wise Hourly Sales Chart Settings")
-    
-    chart_type_brands = st.sidebar.selectbox(
-        "Select Chart Type (Brand-wise)", 
-        ["Line Chart", "Bar Chart", "Area Chart"], 
-        key="hourly_sales_chart_type_brands"
-    )
-    
-    show_data_labels_brands = st.sidebar.checkbox(
-        "Show Data Labels (Brand-wise)", 
-        False, 
-        key="hourly_sales_show_data_labels_brands"
-    )
+    # Chart and its controls rerun on their own when a control changes
+    render_brand_hourly_chart(hourly_sales)
+
+    # Aggregated Hourly Sales Analysis (with 24 columns for total sales)
+    st.subheader("Total Hourly Sales")
+
+    # Aggregated hourly sales data (with 24 columns for each hour)
+    total_hourly_sales = tables['total_hourly_sales']
+
+    # Display aggregated data table (with 24 columns representing each hour)
+    show_table(total_hourly_sales, key="total_hourly_sales_table", formats={
+        'total_selling_price': MONEY,
+        'total_cost_price': MONEY,
+    })
+
+    # Chart and its controls rerun on their own when a control changes
+    render_total_hourly_chart(total_hourly_sales)
+
+    # Weekday and store heatmaps come from the same pass as the brand grid
+    heatmaps = {label: tables[name] for label, name in [('Day of Week', 'day_hourly_sales'), ('Store', 'store_hourly_sales')]
+                if name in tables}
+    if heatmaps:
+        st.subheader("Hourly Sales Heatmap")
+        render_hourly_heatmap(heatmaps)
+
+@st.fragment
+def render_brand_hourly_chart(hourly_sales):
+    # Options for the brand-wise chart above it; many brands default to the heatmap
+    chart_types = ["Line Chart", "Bar Chart", "Area Chart", "Heatmap"]
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type_brands = st.selectbox(
+            "Select Chart Type (Brand-wise)", 
+            chart_types, 
+            index=default_chart_index(chart_types, len(hourly_sales)),
+            key="hourly_sales_chart_type_brands"
+        )
+    with col2:
+        show_data_labels_brands = st.checkbox(
+            "Show Data Labels (Brand-wise)", 
+            False, 
+            key="hourly_sales_show_data_labels_brands"
+        )
     
     # Reshaping the data for plotting (long format)
     hourly_sales_long = hourly_sales.melt(id_vars='brandName', 
                                           value_vars=hourly_sales.columns[1:], 
                                           var_name='hour', 
                                           value_name='total_selling_price')
+
+    # Largest brands plus an "Others" trace instead of one trace per brand
+    chart_data = reduce_chart_frame(hourly_sales_long, 'hour', 'total_selling_price', 'brandName')
     
     # Chart rendering for brand-wise analysis
-    if chart_type_brands == "Line Chart":
-        fig_brands = px.line(hourly_sales_long, x='hour', y='total_selling_price', color='brandName',
-                             title="Brand-wise Hourly Sales",
+    if chart_type_brands == "Heatmap":
+        fig_brands = grid_heatmap_figure(hourly_sales.set_index('brandName'),
+                                         title="Brand-wise Hourly Sales",
+                                         labels={'x': 'Hour', 'y': 'Brand', 'color': 'Total Sales'})
+    elif chart_type_brands == "Line Chart":
+        fig_brands = px.line(chart_data, x='hour', y='total_selling_price', color='brandName',
+                             title="Brand-wise Hourly Sales", render_mode=line_render_mode(chart_data),
                              labels={'total_selling_price': 'Total Sales', 'hour': 'Hour'})
     elif chart_type_brands == "Bar Chart":
-        fig_brands = px.bar(hourly_sales_long, x='hour', y='total_selling_price', color='brandName',
+        fig_brands = px.bar(chart_data, x='hour', y='total_selling_price', color='brandName',
                             title="Brand-wise Hourly Sales",
                             labels={'total_selling_price': 'Total Sales', 'hour': 'Hour'})
     else:
-        fig_brands = px.area(hourly_sales_long, x='hour', y='total_selling_price', color='brandName',
+        fig_brands = px.area(chart_data, x='hour', y='total_selling_price', color='brandName',
                              title="Brand-wise Hourly Sales",
                              labels={'total_selling_price': 'Total Sales', 'hour': 'Hour'})
     
     # Ensure all hours (0-23) are on the x-axis
     fig_brands.update_xaxes(range=[0, 23], tickmode='linear', tick0=0, dtick=1)
     
-    if show_data_labels_brands:
+    if show_data_labels_brands and chart_type_brands != "Heatmap":
         fig_brands.update_traces(textposition="top center")
     
     # Display the Brand-wise Hourly Sales chart
-    st.plotly_chart(fig_brands, use_container_width=True)
+    plotly_chart(fig_brands, use_container_width=True)
 
-    # Aggregated Hourly Sales Analysis (with 24 columns for total sales)
-    st.subheader("Total Hourly Sales")
-
-    # Aggregated hourly sales data (with 24 columns for each hour)
-    total_hourly_sales = filtered_data.groupby('hour').agg(
-        total_selling_price=('total_selling_price', 'sum'),
-        total_cost_price=('total_cost_price', 'sum'),
-        quantity=('quantity', 'sum')
-    ).reset_index()
-
-    # Display aggregated data table (with 24 columns representing each hour)
-    st.dataframe(total_hourly_sales)
-
-    # Sidebar options for aggregated chart
-    st.sidebar.subheader("Aggregated Hourly Sales Chart Settings")
-
-    chart_type_total = st.sidebar.selectbox(
-        "Select Chart Type (Aggregated)", 
-        ["Line Chart", "Bar Chart", "Area Chart"], 
-        key="hourly_sales_chart_type_total"
-    )
-
-    show_data_labels_total = st.sidebar.checkbox(
-        "Show Data Labels (Aggregated)", 
-        False, 
-        key="hourly_sales_show_data_labels_total"
-    )
+@st.fragment
+def render_total_hourly_chart(total_hourly_sales):
+    # Options for the aggregated chart above it
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type_total = st.selectbox(
+            "Select Chart Type (Aggregated)", 
+            ["Line Chart", "Bar Chart", "Area Chart"], 
+            key="hourly_sales_chart_type_total"
+        )
+    with col2:
+        show_data_labels_total = st.checkbox(
+            "Show Data Labels (Aggregated)", 
+            False, 
+            key="hourly_sales_show_data_labels_total"
+        )
 
     # Chart rendering for aggregated analysis
     if chart_type_total == "Line Chart":
@@ -118,4 +135,14 @@ def hourly_sales_analysis(data, selected_brands):
         fig_total.update_traces(textposition="outside")
 
     # Display the Aggregated Hourly Sales chart
-    st.plotly_chart(fig_total, use_container_width=True)
+    plotly_chart(fig_total, use_container_width=True)
+
+@st.fragment
+def render_hourly_heatmap(heatmaps):
+    # Sales by hour against the weekday or the store
+    group_by = st.selectbox("Group Hourly Sales By", list(heatmaps), key="hourly_sales_heatmap_group")
+    grid = heatmaps[group_by]
+    fig = grid_heatmap_figure(grid.set_index(grid.columns[0]),
+                              title=f"Hourly Sales by {group_by}",
+                              labels={'x': 'Hour', 'y': group_by, 'color': 'Total Sales'})
+    plotly_chart(fig, use_container_width=True)
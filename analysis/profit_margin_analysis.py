@@ -1,40 +1,35 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from analysis.tables import profit_margin_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, PERCENT, show_table
 
-def profit_margin_analysis(data, selected_brands):
+def profit_margin_analysis(aggregates, selected_brands, selected_stores):
     st.markdown("<h1 style='text-align: center; color: green;'>Profit Analysis</h1>", unsafe_allow_html=True)
 
-    # Filter data for selected brands
-    filtered_data = data[data['brandName'].isin(selected_brands)]
-
-    # Ensure sellingPrice, costPrice, and quantity are numeric
-    filtered_data['sellingPrice'] = pd.to_numeric(filtered_data['sellingPrice'], errors='coerce')
-    filtered_data['costPrice'] = pd.to_numeric(filtered_data['costPrice'], errors='coerce')
-    filtered_data['quantity'] = pd.to_numeric(filtered_data['quantity'], errors='coerce')
-
-    # Calculate total selling price and total cost price by multiplying by quantity
-    filtered_data['total_sellingPrice'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_costPrice'] = filtered_data['costPrice'] * filtered_data['quantity']
-
-    # Group by brand and sum the total sellingPrice and total costPrice
-    brand_grouped = (filtered_data.groupby('brandName')
-                     .agg({'total_sellingPrice': 'sum', 'total_costPrice': 'sum'})
-                     .reset_index())
-
-    # Calculate average profit margin based on summed values
-    brand_grouped['avg_profit_margin'] = ((brand_grouped['total_sellingPrice'] - brand_grouped['total_costPrice']) / 
-                                          brand_grouped['total_sellingPrice']) * 100
+    # Per-brand totals and average profit margin for the selected brands and stores
+    with timed('compute'):
+        brand_grouped = cached_tables(lambda: profit_margin_table(aggregates, selected_brands, selected_stores))
 
     # Display data table with all required features, including total_sellingPrice and total_costPrice
-    st.dataframe(brand_grouped)
-
-    # Sidebar options for chart customization
-    st.sidebar.subheader("Profit Margin Chart Settings")
-    
-    # Assign unique keys to interactive elements
-    chart_type = st.sidebar.selectbox("Select Chart Type", ["Bar Chart", "Scatter Plot"], key="profit_margin_chart_type")
-    show_data_labels = st.sidebar.checkbox("Show Data Labels", False, key="profit_margin_show_data_labels")
+    show_table(brand_grouped, key="profit_margin_table", formats={
+        'total_sellingPrice': MONEY,
+        'total_costPrice': MONEY,
+        'avg_profit_margin': PERCENT,
+    })
+
+    # Chart and its controls rerun on their own when a control changes
+    render_profit_margin_chart(brand_grouped)
+
+@st.fragment
+def render_profit_margin_chart(brand_grouped):
+    # Options for chart customization above the chart, with unique keys
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.selectbox("Select Chart Type", ["Bar Chart", "Scatter Plot"], key="profit_margin_chart_type")
+    with col2:
+        show_data_labels = st.checkbox("Show Data Labels", False, key="profit_margin_show_data_labels")
 
     # Chart rendering based on user selection
     color_palette = px.colors.qualitative.Set3  # A predefined colorful palette from Plotly
@@ -55,4 +50,4 @@ def profit_margin_analysis(data, selected_brands):
         if show_data_labels:
             fig.update_traces(text=brand_grouped['avg_profit_margin'].round(2), textposition="top center")
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
@@ -1,63 +1,86 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from analysis.tables import store_performance_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import MONEY, PERCENT, show_table
+from utils.stores import COORDINATES_PATH, StoreDimension
 
-# Load the GPS coordinates from the CSV file
-def load_coordinates(file_path="gps_co_ordinates/co_ordinates.csv"):
-    gps_df = pd.read_csv(file_path)
-    return gps_df[['storeName', 'latitude', 'longitude']]
+# Store coordinates and their spatial index, read once per process
+@st.cache_resource
+def load_store_dimension(file_path=COORDINATES_PATH):
+    return StoreDimension.from_csv(file_path)
 
 # Function to display store performance analysis
 def store_performance_analysis(data, date_filtered_data, selected_brands, selected_stores):
     st.markdown("<h1 style='text-align: center; color: green;'>Stores Performance</h1>", unsafe_allow_html=True)
 
-    # Calculate sales for all brands by store (using date_filtered_data)
-    all_brands_store_sales = date_filtered_data.groupby('storeName').agg(
-        total_store_sales=('sellingPrice', lambda x: (x * date_filtered_data.loc[x.index, 'quantity']).sum())
-    ).reset_index()
+    # Selected-brand sales, quantity and profit per store with their contribution percentages
+    with timed('compute'):
+        store_performance = cached_tables(lambda: store_performance_table(data, date_filtered_data, selected_brands, selected_stores))
 
-    # Filter data for selected brands
-    filtered_data = data[data['brandName'].isin(selected_brands)]
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
-    filtered_data['profit'] = filtered_data['total_selling_price'] - filtered_data['total_cost_price']
+    # Chart and its controls rerun on their own when a control changes
+    render_store_performance_chart(store_performance.copy())
 
-    # Filter data for selected stores
-    filtered_data = filtered_data[filtered_data['storeName'].isin(selected_stores)]
+    st.markdown("<h4 style='text-align: center; color: green;'>Store performance dataframe</h4>", unsafe_allow_html=True)
 
-    # Aggregate data by storeName for filtered data
-    store_performance = filtered_data.groupby('storeName').agg(
-        total_selling_price=('total_selling_price', 'sum'),
-        total_quantity=('quantity', 'sum'),
-        profit=('profit', 'sum'),
-    ).reset_index()
+    # Display data table, colouring negative contribution percentages red
+    show_table(store_performance, key="store_performance_table", formats={
+        'total_selling_price': MONEY,
+        'profit': MONEY,
+        'total_store_sales': MONEY,
+        'contribution_percentage': PERCENT,
+        'profit_contribution': PERCENT,
+    }, color_columns=['contribution_percentage'])
 
-    # Sort the DataFrame by total_selling_price in descending order
-    store_performance = store_performance.sort_values(by='total_selling_price', ascending=False)
+    # Look up each store's coordinates in the cached store dimension
+    stores = load_store_dimension()
+    located_stores = stores.attach(store_performance)
 
-    # Merge with all_brands_store_sales to get total store sales
-    store_performance = store_performance.merge(all_brands_store_sales, on='storeName', how='left')
+    # Stores without valid latitude and longitude are left off the map; past
+    # MAX_MAP_POINTS stores, nearby stores are merged into one point per region
+    store_performance = stores.cluster(located_stores, ['total_selling_price'])
 
-    # Ensure the relevant columns are numeric
-    store_performance['total_selling_price'] = pd.to_numeric(store_performance['total_selling_price'], errors='coerce')
-    store_performance['total_store_sales'] = pd.to_numeric(store_performance['total_store_sales'], errors='coerce')
+    # Separate section for map visualization
+    st.markdown("<h3 style='text-align: center; color: blue;'>Store Location Map</h3>", unsafe_allow_html=True)
 
-    # Calculate the contribution percentage of total_selling_price to total_store_sales
-    store_performance['contribution_percentage'] = (
-        (store_performance['total_selling_price'] / store_performance['total_store_sales']) * 100
+    # Ensure that total_selling_price is numeric before calculating size
+    size_variable = store_performance['total_selling_price'].fillna(0)
+    
+    # Now proceed with the scatter_mapbox plot using this separate size_variable
+    fig_map = px.scatter_mapbox(
+        store_performance,
+        lat='latitude',
+        lon='longitude',
+        size=size_variable,
+        size_max=50,
+        color='storeName',
+        hover_name='storeName', 
+        hover_data={'storeName': True, 'total_selling_price': True},
+        title="Store Locations",
+        zoom=5,
+    )
+
+    # Increase the height of the map
+    fig_map.update_layout(
+        mapbox_style="open-street-map",
+        height=800,
     )
-    # Format contribution_percentage for better readability
-    store_performance['contribution_percentage'] = store_performance['contribution_percentage'].apply(lambda x: f"{x:.2f}%")
 
-    # Format profit contribution for better readability
-    overall_profit = store_performance['profit'].sum()
-    store_performance['profit_contribution'] = (store_performance['profit'] / overall_profit) * 100
-    store_performance['profit_contribution'] = store_performance['profit_contribution'].apply(lambda x: f"{x:.2f}%")
+    plotly_chart(fig_map, use_container_width=True)
 
-    # Sidebar options for chart customization
-    st.sidebar.subheader("Store Performance Chart Settings")
-    chart_type = st.sidebar.selectbox("Select Chart Type", ["Bar Chart", "Pie Chart", "Line Chart"])
-    show_data_labels = st.sidebar.checkbox("Show Data Labels", False, key="store_performance_show_data_labels")
+    # Sales of the stores around a chosen store, looked up per store rather
+    # than from the map's clustered points
+    render_nearby_stores(stores, located_stores)
+
+@st.fragment
+def render_store_performance_chart(store_performance):
+    # Options for chart customization above the chart
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.selectbox("Select Chart Type", ["Bar Chart", "Pie Chart", "Line Chart"], key="store_performance_chart_type")
+    with col2:
+        show_data_labels = st.checkbox("Show Data Labels", False, key="store_performance_show_data_labels")
 
     # Define a color palette for the charts
     color_palette = px.colors.qualitative.Plotly
@@ -100,74 +123,26 @@ def store_performance_analysis(data, date_filtered_data, selected_brands, select
         if show_data_labels:
             fig.update_traces(text=store_performance['total_selling_price'], textposition="top center")
 
-    st.plotly_chart(fig, use_container_width=True)
-
-    st.markdown("<h4 style='text-align: center; color: green;'>Store performance dataframe</h4>", unsafe_allow_html=True)
-
-    # Conditional formatting for negative and positive contribution_percentage
-    def format_contribution(val):
-        if isinstance(val, str) and val.endswith('%'):
-            percentage = float(val[:-1])
-            if percentage < 0:
-                return 'color: red'
-            else:
-                return 'color: green'
-        return ''
-
-    # Ensure numeric columns are correctly formatted (convert to numeric if necessary)
-    store_performance['total_selling_price'] = pd.to_numeric(store_performance['total_selling_price'], errors='coerce')
-    store_performance['profit'] = pd.to_numeric(store_performance['profit'], errors='coerce')
-    store_performance['total_store_sales'] = pd.to_numeric(store_performance['total_store_sales'], errors='coerce')
-
-    # Round the relevant columns to 2 decimal places
-    store_performance['total_selling_price'] = store_performance['total_selling_price'].round(2)
-    store_performance['profit'] = store_performance['profit'].round(2)
-    store_performance['total_store_sales'] = store_performance['total_store_sales'].round(2)
-
-    # Apply formatting to these columns (keeping them numeric)
-    store_performance['total_selling_price'] = store_performance['total_selling_price'].apply(lambda x: f"{x:.2f}")
-    store_performance['profit'] = store_performance['profit'].apply(lambda x: f"{x:.2f}")
-    store_performance['total_store_sales'] = store_performance['total_store_sales'].apply(lambda x: f"{x:.2f}")
-
-    # Display data table with conditional formatting
-    st.dataframe(store_performance.style.applymap(format_contribution, subset=['contribution_percentage']))
-
-    # Load GPS coordinates for stores from CSV file
-    gps_df = load_coordinates()
-    
-    # Merge preloaded GPS coordinates with store_performance
-    store_performance = store_performance.merge(gps_df, on='storeName', how='left')
-
-    # Filter out stores without valid latitude and longitude
-    store_performance = store_performance.dropna(subset=['latitude', 'longitude'])
-
-    # Separate section for map visualization
-    st.markdown("<h3 style='text-align: center; color: blue;'>Store Location Map</h3>", unsafe_allow_html=True)
-
-    # Ensure numeric columns are correctly formatted (convert to numeric if necessary)
-    store_performance['total_selling_price'] = pd.to_numeric(store_performance['total_selling_price'], errors='coerce')
-
-    # Ensure that total_selling_price is numeric before calculating size
-    size_variable = store_performance['total_selling_price'].fillna(0)
-    
-    # Now proceed with the scatter_mapbox plot using this separate size_variable
-    fig_map = px.scatter_mapbox(
-        store_performance,
-        lat='latitude',
-        lon='longitude',
-        size=size_variable,
-        size_max=50,
-        color='storeName',
-        hover_name='storeName', 
-        hover_data={'storeName': True, 'total_selling_price': True},
-        title="Store Locations",
-        zoom=5,
-    )
-
-    # Increase the height of the map
-    fig_map.update_layout(
-        mapbox_style="open-street-map",
-        height=800,
-    )
-
-    st.plotly_chart(fig_map, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def render_nearby_stores(stores, store_performance):
+    if len(stores.names) == 0:
+        return
+    st.markdown("<h4 style='text-align: center; color: green;'>Nearby Stores</h4>", unsafe_allow_html=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        store_name = st.selectbox("Stores Around", list(stores.names), key="nearby_stores_store")
+    with col2:
+        radius_km = st.number_input("Within (km)", min_value=1, max_value=2000, value=50, step=10, key="nearby_stores_radius")
+
+    position = stores.positions[store_name]
+    nearby = stores.within(stores.latitude[position], stores.longitude[position], radius_km)
+    sales = store_performance[['storeName', 'total_selling_price']].drop_duplicates('storeName')
+    nearby = nearby.merge(sales, on='storeName', how='left')
+    show_table(nearby, key="nearby_stores_table", formats={
+        'latitude': '%.5f',
+        'longitude': '%.5f',
+        'distance_km': '%.1f',
+        'total_selling_price': MONEY,
+    }, hide_index=True)
@@ -0,0 +1,278 @@
+import numpy as np
+import pandas as pd
+from utils.calendar_dim import WEEKDAY_NAMES
+from utils.distinct import distinct_count
+from utils.filters import category_mask
+from utils.growth import ROLLING_WINDOW, growth_frame, growth_matrix
+from utils.hourly import HOURS, grid_frame, hourly_grids
+
+# Result tables behind the dashboard sections. Nothing here touches Streamlit,
+# so the same numbers can be produced headless by batch.py and rendered by the
+# section functions in the app
+
+def brand_performance_table(aggregates, selected_brands, selected_stores):
+    # Per-brand totals for the selected brands and stores, shared with the other sections
+    aggregated_data = aggregates.totals('brandName', brands=selected_brands, stores=selected_stores)
+    aggregated_data = aggregated_data.drop(columns='row_count').rename(columns={'quantity': 'total_quantity'})
+
+    # Categories sold per brand, counted from the brand x category roll-up
+    brand_categories = aggregates.totals(['brandName', 'categoryName'], brands=selected_brands, stores=selected_stores)
+    category_count = brand_categories.groupby('brandName', observed=True).size()
+    aggregated_data['category_count'] = aggregated_data['brandName'].map(category_count).fillna(0).astype(int)
+
+    # Calculate overall total sales and profit based on the filtered data
+    overall_total_selling_price = aggregated_data['total_selling_price'].sum()
+    overall_total_cost_price = aggregated_data['total_cost_price'].sum()
+    overall_profit = overall_total_selling_price - overall_total_cost_price
+
+    aggregated_data = aggregated_data.sort_values(by='total_selling_price', ascending=False)
+
+    # Profit, margin and contribution percentages based on overall totals
+    aggregated_data['profit'] = aggregated_data['total_selling_price'] - aggregated_data['total_cost_price']
+    aggregated_data['profit_margin'] = (aggregated_data['profit'] / aggregated_data['total_selling_price']) * 100
+    aggregated_data['sales_contribution'] = (aggregated_data['total_selling_price'] / overall_total_selling_price) * 100
+    aggregated_data['profit_contribution'] = (aggregated_data['profit'] / overall_profit) * 100
+    return aggregated_data
+
+def weekly_brand_rows(data, selected_brands_sidebar, top_brands):
+    # Filter data for the selected brands (sidebar filter)
+    if len(selected_brands_sidebar) > 0:
+        filtered_data = data[category_mask(data['brandName'], selected_brands_sidebar)]
+    else:
+        filtered_data = data
+
+    # Further filter data based on top N brands if top_brands is provided
+    if top_brands:
+        filtered_data = filtered_data[category_mask(filtered_data['brandName'], top_brands)]
+    return filtered_data
+
+def weekly_sales_tables(data, selected_brands_sidebar, top_brands):
+    filtered_data = weekly_brand_rows(data, selected_brands_sidebar, top_brands)
+    if filtered_data.empty:
+        return None
+
+    # day, month_year and week_number come from the calendar at load time; months
+    # are grouped with their year so the same month of different years stays apart
+
+    # Aggregate sales data based on unique brandName and day of the week. Distinct
+    # categories per group are exact for small selections and read from mergeable
+    # sketches on large ones; see utils.distinct
+    weekly_sales = (
+        filtered_data.groupby(['month_year', 'brandName', 'day'], as_index=False, observed=True)
+        .agg(
+            total_selling_price=('total_selling_price', 'sum'),
+            total_cost_price=('total_cost_price', 'sum'),
+            total_quantity=('quantity', 'sum')
+        )
+        .assign(category_count=distinct_count(filtered_data, ['month_year', 'brandName', 'day'], 'categoryName'))
+        .sort_values(by=['month_year', 'day'])
+    )
+
+    # Pivot the DataFrame to create separate columns for each day
+    sales_by_day = weekly_sales.pivot_table(
+        index=['month_year', 'brandName'],
+        columns='day',
+        values='total_selling_price',
+        fill_value=0,
+        observed=True
+    ).reset_index()
+
+    weekly_sales_data = (
+        filtered_data.groupby(['day', 'brandName'], as_index=False, observed=True)
+        .agg(
+            total_selling_price=('total_selling_price', 'sum'),
+            total_cost_price=('total_cost_price', 'sum'),
+            total_quantity=('quantity', 'sum')
+        )
+        .assign(category_count=distinct_count(filtered_data, ['day', 'brandName'], 'categoryName'))
+        .sort_values(by='day')
+    )
+
+    # Aggregate sales data based on brand, month, and week of the month; only the
+    # sales are pivoted, so no category count is taken here
+    weekly_sales_by_week = (
+        filtered_data.groupby(['month_year', 'brandName', 'week_number'], as_index=False, observed=True)
+        .agg(
+            total_selling_price=('total_selling_price', 'sum'),
+            total_cost_price=('total_cost_price', 'sum'),
+            total_quantity=('quantity', 'sum')
+        )
+    )
+
+    # Label the weeks on the aggregated rows instead of on every transaction
+    weekly_sales_by_week.insert(2, 'week_label', 'Week ' + weekly_sales_by_week.pop('week_number').astype(str))
+    weekly_sales_by_week = weekly_sales_by_week.sort_values(by=['month_year', 'week_label'])
+
+    # Pivot the DataFrame to create separate columns for each week label
+    sales_by_week = weekly_sales_by_week.pivot_table(
+        index=['month_year', 'brandName'],
+        columns='week_label',
+        values='total_selling_price',
+        fill_value=0,
+        observed=True
+    ).reset_index()
+
+    # Growth of each week on the previous week of the month, for all brands in
+    # one array operation; undefined (NaN) when the previous week had no sales
+    week_columns = list(sales_by_week.columns[2:])
+    growth = growth_matrix(sales_by_week[week_columns].to_numpy(dtype='float64'))[:, 1:]
+    growth_columns = [f"{week}_growth" for week in week_columns[1:]]
+    sales_by_week_growth = pd.concat(
+        [sales_by_week.drop(columns='month_year'), pd.DataFrame(growth, columns=growth_columns, index=sales_by_week.index)],
+        axis=1)
+
+    # Average of the defined growth values of each row
+    sales_by_week_growth['average_growth'] = sales_by_week_growth[growth_columns].mean(axis=1).round(2) if growth_columns else np.nan
+
+    # Round the growth and week columns to 2 decimal places
+    for col in sales_by_week_growth.columns:
+        if 'growth' in col or (col.startswith('Week') and not col.endswith('growth')):
+            sales_by_week_growth[col] = sales_by_week_growth[col].round(2)
+
+    return {
+        'sales_by_day': sales_by_day,
+        'weekly_sales': weekly_sales_data,
+        'sales_by_week': sales_by_week,
+        'weekly_growth': sales_by_week_growth,
+    }
+
+def sales_growth_table(data, selected_brands_sidebar, top_brands, by='brandName', freq='W', window=ROLLING_WINDOW):
+    # Week- or month-over-month, year-over-year and rolling-average growth of
+    # sales for every brand, store or category of the weekly selection
+    filtered_data = weekly_brand_rows(data, selected_brands_sidebar, top_brands)
+    periods = filtered_data['orderDate'].dt.to_period(freq)
+    return growth_frame(periods, filtered_data[by], filtered_data['total_selling_price'], by, window)
+
+def daily_sales_table(data, selected_brands):
+    # Filter data based on selected brands
+    daily_sales_data = data[category_mask(data['brandName'], selected_brands)]
+
+    # Aggregate daily sales for each brand
+    daily_sales = daily_sales_data.groupby([daily_sales_data['orderDate'].dt.date, 'brandName'], observed=True).agg(
+        total_sales=('total_selling_price', 'sum'),
+        total_quantity=('quantity', 'sum'),
+        total_cost=('total_cost_price', 'sum')
+    ).reset_index()
+
+    # Add profit calculation: total sales minus total cost
+    daily_sales['profit'] = daily_sales['total_sales'] - daily_sales['total_cost']
+    return daily_sales
+
+def store_performance_table(data, date_filtered_data, selected_brands, selected_stores):
+    # Calculate sales for all brands by store (using date_filtered_data)
+    all_brands_store_sales = date_filtered_data.groupby('storeName', observed=True).agg(
+        total_store_sales=('total_selling_price', 'sum')
+    ).reset_index()
+
+    # Filter data for selected brands and stores
+    filtered_data = data[category_mask(data['brandName'], selected_brands)]
+    filtered_data = filtered_data[category_mask(filtered_data['storeName'], selected_stores)]
+
+    # Aggregate data by storeName for filtered data
+    store_performance = filtered_data.groupby('storeName', observed=True).agg(
+        total_selling_price=('total_selling_price', 'sum'),
+        total_quantity=('quantity', 'sum'),
+        total_cost_price=('total_cost_price', 'sum'),
+    ).reset_index()
+    store_performance['profit'] = store_performance['total_selling_price'] - store_performance.pop('total_cost_price')
+
+    # Sort the DataFrame by total_selling_price in descending order
+    store_performance = store_performance.sort_values(by='total_selling_price', ascending=False)
+
+    # Merge with all_brands_store_sales to get total store sales
+    store_performance = store_performance.merge(all_brands_store_sales, on='storeName', how='left')
+
+    # Contribution of each store's selected-brand sales to its total sales, and
+    # of its profit to the overall profit
+    store_performance['contribution_percentage'] = (
+        (store_performance['total_selling_price'] / store_performance['total_store_sales']) * 100
+    )
+    overall_profit = store_performance['profit'].sum()
+    store_performance['profit_contribution'] = (store_performance['profit'] / overall_profit) * 100
+    return store_performance
+
+def hourly_sales_tables(data, selected_brands):
+    # Brand, store and weekday x hour grids for the selected brands from one
+    # bincount pass per measure; see utils.hourly
+    groupings = [by for by in ['brandName', 'storeName', 'day'] if by in data.columns]
+    grids = hourly_grids(data, groupings, mask=category_mask(data['brandName'], selected_brands))
+
+    # Brand-wise sales with 24 columns, one for each hour
+    labels, present, brand_grids = grids['brandName']
+    hourly_sales = grid_frame(labels, present, brand_grids['total_selling_price'], 'brandName')
+
+    # Hourly totals are the column sums of the brand grids
+    total_hourly_sales = pd.DataFrame({
+        'hour': range(HOURS),
+        'total_selling_price': brand_grids['total_selling_price'].sum(axis=0),
+        'total_cost_price': brand_grids['total_cost_price'].sum(axis=0),
+        'quantity': brand_grids['quantity'].sum(axis=0).round().astype('int64'),
+    })
+    tables = {'hourly_sales': hourly_sales, 'total_hourly_sales': total_hourly_sales}
+
+    # Store and weekday heatmaps of sales, weekdays in calendar order
+    if 'storeName' in grids:
+        labels, present, store_grids = grids['storeName']
+        tables['store_hourly_sales'] = grid_frame(labels, present, store_grids['total_selling_price'], 'storeName')
+    if 'day' in grids:
+        labels, present, day_grids = grids['day']
+        day_hourly_sales = grid_frame(labels, present, day_grids['total_selling_price'], 'day')
+        order = day_hourly_sales['day'].map({name: i for i, name in enumerate(WEEKDAY_NAMES)})
+        tables['day_hourly_sales'] = day_hourly_sales.iloc[order.argsort()].reset_index(drop=True)
+    return tables
+
+def category_breakdown_table(data, selected_brands):
+    # Filter data for selected brands
+    filtered_data = data[category_mask(data['brandName'], selected_brands)]
+
+    # Aggregate total_sales, total_cost, and quantity by categoryName
+    category_sales = filtered_data.groupby('categoryName', observed=True).agg(
+        total_sales=('total_selling_price', 'sum'),
+        total_cost=('total_cost_price', 'sum'),
+        total_quantity=('quantity', 'sum')
+    ).reset_index()
+
+    # Calculate profit and profit margin
+    category_sales['profit'] = category_sales['total_sales'] - category_sales['total_cost']
+    category_sales['profit_margin'] = ((category_sales['profit'] / category_sales['total_sales']) * 100).round(2)
+
+    # Sort the dataframe by total_sales in descending order
+    return category_sales.sort_values(by='total_sales', ascending=False)
+
+def profit_margin_table(aggregates, selected_brands, selected_stores):
+    # Per-brand totals for the selected brands and stores, shared with the other sections
+    brand_grouped = (aggregates.totals('brandName', brands=selected_brands, stores=selected_stores)
+                     [['brandName', 'total_selling_price', 'total_cost_price']]
+                     .rename(columns={'total_selling_price': 'total_sellingPrice', 'total_cost_price': 'total_costPrice'}))
+
+    # Calculate average profit margin based on summed values
+    brand_grouped['avg_profit_margin'] = ((brand_grouped['total_sellingPrice'] - brand_grouped['total_costPrice']) /
+                                          brand_grouped['total_sellingPrice']) * 100
+    return brand_grouped
+
+def top_products_table(data, selected_brands):
+    # Filter data for selected brands
+    filtered_data = data[category_mask(data['brandName'], selected_brands)]
+
+    # Calculate profit and profit margin (per item)
+    profit = filtered_data['sellingPrice'].astype('float64') - filtered_data['costPrice']
+    filtered_data = filtered_data.assign(profit=profit, profit_margin=(profit / filtered_data['sellingPrice']) * 100)
+
+    # Group by productId, productName, and categoryName to calculate total sales, profit, cost, and quantity
+    top_products = (filtered_data.groupby(['productId', 'productName', 'categoryName'], observed=True)
+                    .agg({
+                        'total_selling_price': 'sum',
+                        'total_cost_price': 'sum',
+                        'profit': 'sum',
+                        'profit_margin': 'mean',
+                        'quantity': 'sum'
+                    })
+                    .sort_values(by='total_selling_price', ascending=False)
+                    .reset_index())
+
+    # Rename columns for clarity
+    return top_products.rename(columns={
+        'total_selling_price': 'Selling Price',
+        'quantity': 'Total Quantity',
+        'total_cost_price': 'Cost'
+    })
@@ -1,60 +1,48 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from analysis.tables import top_products_table
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables
+from utils.table_view import COUNT, MONEY, PERCENT, show_table
+
+# Products shown until the user asks for more
+DEFAULT_TOP_PRODUCTS = 50
 
 def top_products_analysis(data, selected_brands):
     st.markdown("<h1 style='text-align: center; color: green;'>Top Product Analysis</h1>", unsafe_allow_html=True)
 
-    # Filter data for selected brands
-    filtered_data = data[data['brandName'].isin(selected_brands)]
-
-    # Calculate profit and profit margin (per item)
-    filtered_data['profit'] = filtered_data['sellingPrice'] - filtered_data['costPrice']
-    filtered_data['profit_margin'] = (filtered_data['profit'] / filtered_data['sellingPrice']) * 100
-
-    # Calculate total selling price and cost by multiplying with quantity
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
-
-    # Group by productId, productName, and categoryName to calculate total sales, profit, cost, and quantity
-    top_products = (filtered_data.groupby(['productId', 'productName', 'categoryName'])
-                    .agg({
-                        'total_selling_price': 'sum', 
-                        'total_cost_price': 'sum',
-                        'profit': 'sum', 
-                        'profit_margin': 'mean', 
-                        'quantity': 'sum'
-                    })
-                    .sort_values(by='total_selling_price', ascending=False)
-                    .reset_index())
-
-    # Rename columns for clarity
-    top_products.rename(columns={
-        'total_selling_price': 'Selling Price',
-        'quantity': 'Total Quantity',
-        'total_cost_price': 'Cost'
-    }, inplace=True)
-
-    # Round the profit margin to 2 decimal places and add a percentage sign
-    top_products['profit_margin'] = top_products['profit_margin'].round(2).map(lambda x: f"{x}%")
+    # Sales, cost, profit and quantity per product for the selected brands
+    with timed('compute'):
+        top_products = cached_tables(lambda: top_products_table(data, selected_brands))
 
     # Determine max number of top products based on unique products for selected brands
-    max_top_products = len(top_products)
+    max_top_products = max(len(top_products), 1)
 
-    # Sidebar option for top products selector with dynamic max value, using a number input box
-    st.sidebar.subheader("Top Products Selector")
-    num_top_products = st.sidebar.number_input("Select Number of Top Products to Display", min_value=1, max_value=max_top_products, value=max_top_products, step=1)  # Default set to max_top_products
+    # Top products table, chart and their controls rerun on their own when a control changes
+    render_top_products(top_products, max_top_products)
+
+@st.fragment
+def render_top_products(top_products, max_top_products):
+    # Top products selector with dynamic max value, using a number input box
+    num_top_products = st.number_input("Select Number of Top Products to Display", min_value=1, max_value=max_top_products, value=min(DEFAULT_TOP_PRODUCTS, max_top_products), step=1)
 
     # Display the selected number of top products by sales, showing categoryName as well
     top_products = top_products.head(num_top_products)
-    st.dataframe(top_products)
-
-    # Sidebar options for chart customization
-    st.sidebar.subheader("Top Products Chart Settings")
-    
-    # Assign unique keys to interactive elements
-    chart_type = st.sidebar.selectbox("Select Chart Type", ["Bar Chart", "Pie Chart"], key="top_products_chart_type")
-    show_data_labels = st.sidebar.checkbox("Show Data Labels", False, key="top_products_show_data_labels")
+    show_table(top_products, key="top_products_table", formats={
+        'Selling Price': MONEY,
+        'Cost': MONEY,
+        'profit': MONEY,
+        'profit_margin': PERCENT,
+        'Total Quantity': COUNT,
+    })
+
+    # Options for chart customization above the chart, with unique keys
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.selectbox("Select Chart Type", ["Bar Chart", "Pie Chart"], key="top_products_chart_type")
+    with col2:
+        show_data_labels = st.checkbox("Show Data Labels", False, key="top_products_show_data_labels")
 
     # Chart rendering based on user selection
     if chart_type == "Bar Chart":
@@ -74,4 +62,4 @@ def top_products_analysis(data, selected_brands):
         if show_data_labels:
             fig.update_traces(text=top_products['Selling Price'].round(2), textposition="inside")
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
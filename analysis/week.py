@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from utils.distinct import distinct_count
+from utils.filters import category_mask
+from utils.growth import growth_matrix
 
 def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
     st.markdown("<h1 style='text-align: center; color: green;'>Weekly Sales</h1>", unsafe_allow_html=True)
@@ -12,63 +15,53 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
 
     # Filter data for the selected brands (sidebar filter)
     if len(selected_brands_sidebar) > 0:
-        filtered_data = data[data['brandName'].isin(selected_brands_sidebar)]
+        filtered_data = data[category_mask(data['brandName'], selected_brands_sidebar)]
     else:
         filtered_data = data
 
     # Further filter data based on top N brands if top_brands is provided
     if top_brands:
-        filtered_data = filtered_data[filtered_data['brandName'].isin(top_brands)]
+        filtered_data = filtered_data[category_mask(filtered_data['brandName'], top_brands)]
 
     # Check if filtered data is empty
     if filtered_data.empty:
         st.warning("No sales data available for the selected brands.")
         return
 
-    # Extract the day of the week and month from orderDate
-    filtered_data['day'] = filtered_data['orderDate'].dt.day_name()
-    filtered_data['month'] = filtered_data['orderDate'].dt.month_name()
+    # day, month_year and week_number come from the calendar at load time; months
+    # are grouped with their year so the same month of different years stays apart
 
-    # Calculate total selling price by multiplying sellingPrice with quantity
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
-
-    # Aggregate sales data based on brand, month, and dynamic week label
-    filtered_data['month_year'] = filtered_data['orderDate'].dt.to_period('M') 
-    filtered_data['week_number'] = filtered_data.groupby('month_year')['orderDate'].transform(
-        lambda x: (x.dt.day - 1) // 7 + 1 
-    )
-    filtered_data['week_label'] = 'Week ' + filtered_data['week_number'].astype(str)
-    
+    # Aggregate sales data based on brand, month, and week of the month
     weekly_sales_by_week = (
-        filtered_data.groupby(['month', 'brandName', 'week_label'], as_index=False)
+        filtered_data.groupby(['month_year', 'brandName', 'week_number'], as_index=False, observed=True)
         .agg(
             total_selling_price=('total_selling_price', 'sum'),
             total_cost_price=('total_cost_price', 'sum'),
-            total_quantity=('quantity', 'sum'),
-            category_count=('categoryName', 'nunique')
+            total_quantity=('quantity', 'sum')
         )
-        .sort_values(by=['month', 'week_label'])
+        .assign(category_count=distinct_count(filtered_data, ['month_year', 'brandName', 'week_number'], 'categoryName'))
     )
 
+    # Label the weeks on the aggregated rows instead of on every transaction
+    weekly_sales_by_week.insert(2, 'week_label', 'Week ' + weekly_sales_by_week.pop('week_number').astype(str))
+    weekly_sales_by_week = weekly_sales_by_week.sort_values(by=['month_year', 'week_label'])
+
     # Pivot the DataFrame to create separate columns for each week label
     sales_by_week = weekly_sales_by_week.pivot_table(
-        index=['month', 'brandName'],
+        index=['month_year', 'brandName'],
         columns='week_label',
         values='total_selling_price',
-        fill_value=0
+        fill_value=0,
+        observed=True
     ).reset_index()
 
-    # Calculate weekly sales growth percentage
-    sales_by_week_growth = sales_by_week.copy()
-    week_columns = sales_by_week.columns[2:]  # All week columns
-
-    # Calculate percentage growth for each week column relative to the previous week
-    for i in range(1, len(week_columns)):
-        week, prev_week = week_columns[i], week_columns[i - 1]
-        sales_by_week_growth[f"{week}_growth"] = (
-            (sales_by_week[week] - sales_by_week[prev_week]) / sales_by_week[prev_week]
-        ) * 100
+    # Calculate weekly sales growth percentage for all brands at once; undefined
+    # (NaN) when the previous week had no sales
+    week_columns = list(sales_by_week.columns[2:])
+    growth = growth_matrix(sales_by_week[week_columns].to_numpy(dtype='float64'))[:, 1:]
+    sales_by_week_growth = pd.concat(
+        [sales_by_week, pd.DataFrame(growth, columns=[f"{week}_growth" for week in week_columns[1:]], index=sales_by_week.index)],
+        axis=1)
 
     # Display the weekly sales with growth percentage
     st.markdown("<h4 style='text-align: center; color: green;'>Week-wise Sales with Growth Percentage</h4>", unsafe_allow_html=True)
@@ -115,7 +108,7 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
             color_discrete_sequence=color_scheme
         )
     elif chart_type == "Donut Chart":
-        donut_data = sales_by_week.melt(id_vars=['month', 'brandName'], value_vars=sales_by_week.columns[2:], 
+        donut_data = sales_by_week.melt(id_vars=['month_year', 'brandName'], value_vars=sales_by_week.columns[2:], 
                                          var_name='week_label', value_name='total_selling_price')
         fig = px.pie(
             donut_data,
@@ -1,7 +1,20 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
+from analysis.tables import sales_growth_table, weekly_sales_tables
+from utils.instrumentation import plotly_chart, timed
+from utils.sections import cached_tables, current_scope
+from utils.table_view import MONEY, PERCENT, show_table
+from utils.chart_data import MAX_SERIES, default_chart_index, grid_heatmap_figure, heatmap_figure, line_render_mode, reduce_chart_frame
+
+# Choices for the growth chart: what a series is, the period length and the comparison
+GROWTH_GROUPS = {'Brand': 'brandName', 'Store': 'storeName', 'Category': 'categoryName'}
+GROWTH_PERIODS = {'Week': 'W', 'Month': 'M'}
+GROWTH_MEASURES = {
+    'Previous Period': 'growth',
+    'Same Period Last Year': 'yoy_growth',
+    'Rolling Average': 'vs_rolling_average',
+}
 
 def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
     st.markdown("<h1 style='text-align: center; color: green;'>Weekly Sales</h1>", unsafe_allow_html=True)
@@ -11,173 +24,94 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
         st.warning("Please upload data and select at least one brand.")
         return
 
-    # Filter data for the selected brands (sidebar filter)
-    if len(selected_brands_sidebar) > 0:
-        filtered_data = data[data['brandName'].isin(selected_brands_sidebar)]
-    else:
-        filtered_data = data
-
-    # Further filter data based on top N brands if top_brands is provided
-    if top_brands:
-        filtered_data = filtered_data[filtered_data['brandName'].isin(top_brands)]
+    # Day-of-week, week-of-month and growth tables for the selected brands
+    with timed('compute'):
+        tables = cached_tables(lambda: weekly_sales_tables(data, selected_brands_sidebar, top_brands))
 
     # Check if filtered data is empty
-    if filtered_data.empty:
+    if tables is None:
         st.warning("No sales data available for the selected brands.")
         return
 
-    # Extract the day of the week and month from orderDate
-    filtered_data['day'] = filtered_data['orderDate'].dt.day_name()
-    filtered_data['month'] = filtered_data['orderDate'].dt.month_name()
-
-    # Calculate total selling price by multiplying sellingPrice with quantity
-    filtered_data['total_selling_price'] = filtered_data['sellingPrice'] * filtered_data['quantity']
-    filtered_data['total_cost_price'] = filtered_data['costPrice'] * filtered_data['quantity']
-
-    # Aggregate sales data based on unique brandName and day of the week
-    weekly_sales = (
-        filtered_data.groupby(['month', 'brandName', 'day'], as_index=False)
-        .agg(
-            total_selling_price=('total_selling_price', 'sum'),
-            total_cost_price=('total_cost_price', 'sum'),
-            total_quantity=('quantity', 'sum'),
-            category_count=('categoryName', 'nunique')
-        )
-        .sort_values(by=['month', 'day'])
-    )
-
-    # Pivot the DataFrame to create separate columns for each day
-    sales_by_day = weekly_sales.pivot_table(
-        index=['month', 'brandName'],
-        columns='day',
-        values='total_selling_price',
-        fill_value=0
-    ).reset_index()
-
-    weekly_sales_data = (
-        filtered_data.groupby(['day', 'brandName'], as_index=False)
-        .agg(
-            total_selling_price=('total_selling_price', 'sum'),
-            total_cost_price=('total_cost_price', 'sum'),
-            total_quantity=('quantity', 'sum'),
-            category_count=('categoryName', 'nunique')
-        )
-        .sort_values(by='day')
-    )
-
-    # Aggregate sales data based on brand, month, and dynamic week label
-    filtered_data['month_year'] = filtered_data['orderDate'].dt.to_period('M') 
-    filtered_data['week_number'] = filtered_data.groupby('month_year')['orderDate'].transform(
-        lambda x: (x.dt.day - 1) // 7 + 1 
-    )
-    filtered_data['week_label'] = 'Week ' + filtered_data['week_number'].astype(str)
-   
-    weekly_sales_by_week = (
-        filtered_data.groupby(['month', 'brandName', 'week_label'], as_index=False)
-        .agg(
-            total_selling_price=('total_selling_price', 'sum'),
-            total_cost_price=('total_cost_price', 'sum'),
-            total_quantity=('quantity', 'sum'),
-            category_count=('categoryName', 'nunique')
-        )
-        .sort_values(by=['month', 'week_label'])
-    )
-
-    # Pivot the DataFrame to create separate columns for each week label
-    sales_by_week = weekly_sales_by_week.pivot_table(
-        index=['month', 'brandName'],
-        columns='week_label',
-        values='total_selling_price',
-        fill_value=0
-    ).reset_index()
-
-
-    # Calculate weekly sales growth percentage
-    sales_by_week_growth = sales_by_week.copy()
-    week_columns = sales_by_week.columns[2:]
-
-    # Calculate percentage growth for each week column relative to the previous week
-    for i in range(1, len(week_columns)):
-        week, prev_week = week_columns[i], week_columns[i - 1]
-        # Handle division by zero
-        prev_week_sales = sales_by_week[prev_week]
-        growth = np.where(
-            prev_week_sales != 0,
-            ((sales_by_week[week] - prev_week_sales) / prev_week_sales) * 100,
-            0  # Set growth to 0% when previous week sales were 0
-        )
-        sales_by_week_growth[f"{week}_growth"] = growth
-
-    # Remove 'month' and 'Week 5' columns along with 'Week 5_growth'
-    columns_to_remove = ['month', 'Week 5', 'Week 5_growth']
-    sales_by_week_growth = sales_by_week_growth.drop(columns=[col for col in columns_to_remove if col in sales_by_week_growth.columns])
-
-    # Calculate average growth for week_2_growth, week_3_growth, and week_4_growth
-    # Calculate average growth for available growth columns dynamically
-    available_growth_columns = [col for col in sales_by_week_growth.columns if col.endswith('_growth') and col != 'average_growth']
-    if available_growth_columns:
-        sales_by_week_growth['average_growth'] = sales_by_week_growth[available_growth_columns].mean(axis=1).round(2)
-    else:
-        sales_by_week_growth['average_growth'] = 0
-
-    # Create a styled DataFrame for display
-    def style_negative_red_positive_green(val):
-        if isinstance(val, (int, float)):
-            color = 'red' if val < 0 else 'green'
-            return f'color: {color}'
-        return ''
+    sales_by_day = tables['sales_by_day']
+    weekly_sales_data = tables['weekly_sales']
+    sales_by_week = tables['sales_by_week']
+    sales_by_week_growth = tables['weekly_growth']
 
     # Format the growth percentage columns
     growth_columns = [col for col in sales_by_week_growth.columns if 'growth' in col]
     week_columns = [col for col in sales_by_week_growth.columns if col.startswith('Week') and not col.endswith('growth')]
 
-    for col in growth_columns:
-        sales_by_week_growth[col] = sales_by_week_growth[col].round(2)
-    for col in week_columns:
-        sales_by_week_growth[col] = sales_by_week_growth[col].round(2)
-
-    # Create a styled DataFrame
-    styled_df = sales_by_week_growth.style.applymap(
-        style_negative_red_positive_green,
-        subset=growth_columns
-    ).format({
-        **{col: "{:.2f}%" for col in growth_columns},
-        **{col: "{:.2f}" for col in week_columns}
-    })
-
     # Display the weekly sales with growth percentage
     st.markdown("<h4 style='text-align: center; color: green;'>Week-wise Sales with Growth Percentage</h4>", unsafe_allow_html=True)
     
-    # Display the interactive dataframe with styling
-    st.dataframe(
-        styled_df,
-        use_container_width=True,
-        hide_index=True
+    # Display the interactive dataframe, growth shown red when negative and green otherwise
+    show_table(sales_by_week_growth, key="weekly_growth_table", formats={
+        **{col: PERCENT for col in growth_columns},
+        **{col: MONEY for col in week_columns},
+    }, color_columns=growth_columns, hide_index=True)
+
+    color_scheme = px.colors.qualitative.Plotly
+
+    # Plot the sales trend by week for each brand (added plot)
+    sales_by_week_trend = sales_by_week.melt(id_vars=['month_year', 'brandName'], value_vars=sales_by_week.columns[2:], 
+                                             var_name='week_label', value_name='total_selling_price')
+
+    # Largest brands plus an "Others" trace instead of one trace per brand
+    sales_by_week_trend = reduce_chart_frame(sales_by_week_trend, 'week_label', 'total_selling_price', 'brandName')
+
+    # Plotting the trend of sales by week
+    fig_week_trend = px.line(
+        sales_by_week_trend,
+        x='week_label',
+        y='total_selling_price',
+        color='brandName',
+        title="Weekly Sales Trend by Brand",
+        labels={'total_selling_price': 'Sales'},
+        render_mode=line_render_mode(sales_by_week_trend),
+        color_discrete_sequence=color_scheme
     )
 
-    # Sidebar options for chart customization
-    st.sidebar.subheader("Weekly Sales Chart Settings")
-    chart_type = st.sidebar.selectbox(
+    # Display the weekly sales trend plot
+    plotly_chart(fig_week_trend, use_container_width=True)
+
+    # Chart and its controls rerun on their own when a control changes
+    render_weekly_sales_chart(weekly_sales_data, sales_by_day)
+
+    # Growth of every series against the previous period, last year or its recent average
+    st.markdown("<h4 style='text-align: center; color: green;'>Sales Growth</h4>", unsafe_allow_html=True)
+    render_growth_chart(data, selected_brands_sidebar, top_brands, current_scope())
+
+@st.fragment
+def render_weekly_sales_chart(weekly_sales_data, sales_by_day):
+    # Options for chart customization above the chart; many brands default to the heatmap
+    chart_types = ["Line Chart", "Bar Chart", "Area Chart", "Donut Chart", "Heatmap"]
+    chart_type = st.selectbox(
         "Select Chart Type", 
-        ["Line Chart", "Bar Chart", "Area Chart", "Donut Chart"], 
-        index=1
+        chart_types, 
+        index=default_chart_index(chart_types, weekly_sales_data['brandName'].nunique(), default=1),
+        key="weekly_sales_chart_type"
     )
     color_scheme = px.colors.qualitative.Plotly
+
+    # Largest brands plus an "Others" trace instead of one trace per brand
+    chart_data = reduce_chart_frame(weekly_sales_data, 'day', 'total_selling_price', 'brandName')
     
     # Chart rendering based on user selection
     if chart_type == "Line Chart":
         fig = px.line(
-            weekly_sales_data,
+            chart_data,
             x='day',
             y='total_selling_price',
             color='brandName',
             title="Weekly Sales Trend",
             labels={'total_selling_price': 'Sales'},
+            render_mode=line_render_mode(chart_data),
             color_discrete_sequence=color_scheme
         )
     elif chart_type == "Bar Chart":
         fig = px.bar(
-            weekly_sales_data,
+            chart_data,
             x='day',
             y='total_selling_price',
             color='brandName',
@@ -187,7 +121,7 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
         )
     elif chart_type == "Area Chart":
         fig = px.area(
-            weekly_sales_data,
+            chart_data,
             x='day',
             y='total_selling_price',
             color='brandName',
@@ -197,7 +131,7 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
         )
     elif chart_type == "Donut Chart":
         # Aggregate total sales for donut chart
-        donut_data = sales_by_day.melt(id_vars=['month', 'brandName'], value_vars=sales_by_day.columns[2:], 
+        donut_data = sales_by_day.melt(id_vars=['month_year', 'brandName'], value_vars=sales_by_day.columns[2:], 
                                          var_name='day', value_name='total_selling_price')
         fig = px.pie(
             donut_data,
@@ -208,25 +142,49 @@ def weekly_sales_analysis(data, selected_brands_sidebar, top_brands):
             color_discrete_sequence=color_scheme
         )
         fig.update_layout(height=600)
-
-    # Plot the sales trend by week for each brand (added plot)
-    sales_by_week_trend = sales_by_week.melt(id_vars=['month', 'brandName'], value_vars=sales_by_week.columns[2:], 
-                                             var_name='week_label', value_name='total_selling_price')
-
-    # Plotting the trend of sales by week
-    fig_week_trend = px.line(
-        sales_by_week_trend,
-        x='week_label',
-        y='total_selling_price',
-        color='brandName',
-        title="Weekly Sales Trend by Brand",
-        labels={'total_selling_price': 'Sales'},
-        color_discrete_sequence=color_scheme
-    )
-
-    # Display the weekly sales trend plot
-    st.plotly_chart(fig_week_trend, use_container_width=True)
+    elif chart_type == "Heatmap":
+        # Every brand as a row of the brand x day grid in a single trace
+        fig = heatmap_figure(weekly_sales_data, 'day', 'total_selling_price', 'brandName',
+                             title="Weekly Sales Trend",
+                             labels={'x': 'Day', 'y': 'Brand', 'color': 'Sales'})
 
     # Display the Plotly chart in Streamlit with container width adjustment
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def render_growth_chart(data, selected_brands_sidebar, top_brands, scope=None):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        group_label = st.selectbox("Growth By", [label for label, col in GROWTH_GROUPS.items() if col in data.columns],
+                                   key="weekly_growth_group")
+    with col2:
+        period_label = st.selectbox("Period", list(GROWTH_PERIODS), key="weekly_growth_period")
+    with col3:
+        measure_label = st.selectbox("Compared With", list(GROWTH_MEASURES), key="weekly_growth_measure")
+    by, measure = GROWTH_GROUPS[group_label], GROWTH_MEASURES[measure_label]
+
+    # One growth table per grouping and period, kept across fragment reruns
+    freq = GROWTH_PERIODS[period_label]
+    growth = cached_tables(lambda: sales_growth_table(data, selected_brands_sidebar, top_brands, by=by, freq=freq),
+                           part=('growth', by, freq), scope=scope)
+    if growth.empty:
+        st.info("No sales to compare for this selection.")
+        return
 
+    # Both charts follow the largest series by sales; the heatmap averages the
+    # growth of the rest into an "Others" row
+    totals = growth.groupby(by, observed=True)['value'].sum()
+    chart_types = ["Line Chart", "Heatmap"]
+    chart_type = st.selectbox("Select Chart Type (Growth)", chart_types,
+                              index=default_chart_index(chart_types, len(totals)), key="weekly_growth_chart_type")
+    title = f"{period_label}ly Sales Growth vs {measure_label} by {group_label}"
+    if chart_type == "Heatmap":
+        grid = growth.pivot(index=by, columns='period', values=measure)
+        fig = grid_heatmap_figure(grid, title=title, labels={'x': period_label, 'y': group_label, 'color': 'Growth %'},
+                                  aggfunc='mean', row_totals=totals)
+    else:
+        chart_data = growth[growth[by].isin(totals.nlargest(MAX_SERIES).index)]
+        fig = px.line(chart_data, x='period', y=measure, color=by, title=title, markers=True,
+                      render_mode=line_render_mode(chart_data),
+                      labels={measure: 'Growth %', 'period': period_label, by: group_label})
+    plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,111 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from analysis.tables import (
+    brand_performance_table,
+    category_breakdown_table,
+    daily_sales_table,
+    hourly_sales_tables,
+    profit_margin_table,
+    store_performance_table,
+    top_products_table,
+    weekly_sales_tables,
+)
+from utils.aggregates import SalesAggregates
+from utils.cube import build_cube, query_cube
+from utils.data_loader import load_data, load_dataset, store_dir_name
+from utils.filters import category_mask, date_range_slice
+
+# Headless counterpart of main.py: computes the dashboard result tables for
+# every store, one worker process per store, and writes them to disk
+OUTPUT_FORMATS = ['parquet', 'csv']
+
+def run_batch(data, out_dir, output_format='parquet', start_date=None, end_date=None, workers=None):
+    out_dir = Path(out_dir)
+    cube = build_cube(data)
+
+    # The cross-store table is written once; everything else is per store
+    all_brands = list(cube['brandName'].dropna().unique())
+    all_stores = list(cube['storeName'].dropna().unique())
+    date_filtered_cube = query_cube(cube, start_date, end_date)
+    store_performance = store_performance_table(cube, date_filtered_cube, all_brands, all_stores)
+    written = {None: [write_table(store_performance, out_dir / 'store_performance', output_format)]}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = {
+            executor.submit(
+                run_store,
+                store_name,
+                data[category_mask(data['storeName'], [store_name])],
+                cube[category_mask(cube['storeName'], [store_name])],
+                out_dir / store_dir_name(store_name),
+                output_format,
+                start_date,
+                end_date,
+            ): store_name
+            for store_name in all_stores
+        }
+        for job, store_name in jobs.items():
+            written[store_name] = job.result()
+    return written
+
+def run_store(store_name, store_data, store_cube, store_dir, output_format, start_date=None, end_date=None):
+    tables = store_tables(store_name, store_data, store_cube, start_date, end_date)
+    return [write_table(table, store_dir / name, output_format) for name, table in tables.items()]
+
+def store_tables(store_name, store_data, store_cube, start_date=None, end_date=None):
+    # The same tables the dashboard shows with this store selected and every
+    # brand it sells in scope
+    brands = list(store_cube['brandName'].dropna().unique())
+    stores = [store_name]
+    aggregates = SalesAggregates(store_cube, start_date, end_date)
+    store_cells = query_cube(store_cube, start_date, end_date)
+    store_rows = date_range_slice(store_data, start_date, end_date)
+
+    tables = {
+        'brand_performance': brand_performance_table(aggregates, brands, stores),
+        'daily_sales': daily_sales_table(store_cells, brands),
+        'category_breakdown': category_breakdown_table(store_cells, brands),
+        'profit_margin': profit_margin_table(aggregates, brands, stores),
+        'top_products': top_products_table(store_rows, brands),
+    }
+    tables.update(hourly_sales_tables(store_cells, brands))
+    tables.update(weekly_sales_tables(store_cells, brands, brands) or {})
+    return tables
+
+def write_table(table, path, output_format):
+    path = path.with_suffix(f".{output_format}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = table.copy()
+    # Pivoted tables have hour or day labels as columns; Parquet needs string names
+    table.columns = [str(col) for col in table.columns]
+    if output_format == 'parquet':
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the dashboard result tables for every store without Streamlit.")
+    parser.add_argument('source', nargs='?', help="sales CSV export; the persisted dataset is used when omitted")
+    parser.add_argument('--out', default='reports', help="output directory (default: reports)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet', dest='output_format')
+    parser.add_argument('--start', type=pd.Timestamp, help="first order date to include, e.g. 2024-10-01")
+    parser.add_argument('--end', type=pd.Timestamp, help="last order date to include")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    # From the persisted dataset only the partitions in the date window are read
+    data = load_data(args.source) if args.source else load_dataset(start_date=args.start, end_date=args.end)
+    if data is None:
+        parser.error("no source CSV given and no persisted dataset found")
+
+    written = run_batch(data, args.out, args.output_format, args.start, args.end, args.workers)
+    n_tables = sum(len(paths) for paths in written.values())
+    print(f"Wrote {n_tables} tables for {len(written) - 1} stores to {args.out}")
+
+if __name__ == '__main__':
+    main()
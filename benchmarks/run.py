@@ -0,0 +1,127 @@
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from analysis.tables import (
+    brand_performance_table,
+    category_breakdown_table,
+    daily_sales_table,
+    hourly_sales_tables,
+    profit_margin_table,
+    store_performance_table,
+    top_products_table,
+    weekly_sales_tables,
+)
+from benchmarks.synthetic import generate_csv
+from utils.aggregates import SalesAggregates
+from utils.cube import build_cube, query_cube
+from utils.data_loader import load_data
+from utils.filters import filter_rows
+from utils.prefix_sums import DailyPrefixSums
+
+# Times loading, filtering, cube building and every analysis table at several
+# data sizes, appending one JSON line per measurement to the results file
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000, 50_000_000]
+TOP_BRANDS = 250
+
+def run_suite(sizes, data_dir, results_path, label=None, memory=True):
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    run_info = {
+        'label': label or git_revision(),
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+    }
+
+    with open(results_path, 'a') as results:
+        for n_rows in sizes:
+            csv_path = data_dir / f"sales-{n_rows}.csv"
+            if not csv_path.exists():
+                generate_csv(csv_path, n_rows)
+            for name, seconds, peak_bytes in size_benchmarks(csv_path, memory):
+                peak_mb = round(peak_bytes / 2**20, 2) if peak_bytes is not None else None
+                record = {**run_info, 'rows': n_rows, 'benchmark': name,
+                          'seconds': round(seconds, 6), 'peak_mb': peak_mb}
+                results.write(json.dumps(record) + '\n')
+                results.flush()
+                peak = f"{peak_mb:10.1f} MB" if peak_mb is not None else f"{'-':>10}"
+                print(f"{n_rows:>12,} {name:<20} {seconds:10.3f}s {peak}")
+
+def size_benchmarks(csv_path, memory=True):
+    data, *timing = measure(load_data, csv_path, memory=memory)
+    yield ('load_data', *timing)
+
+    # The dashboard's defaults: the top brands by row count and every store
+    brands = data['brandName'].value_counts().head(TOP_BRANDS).index.tolist()
+    stores = data['storeName'].dropna().unique().tolist()
+    start_date, end_date = data['orderDate'].min(), data['orderDate'].max()
+
+    filtered_data, *timing = measure(filter_rows, data, brands, stores, start_date, end_date, memory=memory)
+    yield ('filter_data', *timing)
+    cube, *timing = measure(build_cube, data, memory=memory)
+    yield ('build_cube', *timing)
+    filtered_cube, *timing = measure(query_cube, cube, start_date, end_date, brands=brands, stores=stores, memory=memory)
+    yield ('query_cube', *timing)
+    brand_sums, *timing = measure(DailyPrefixSums, cube, 'brandName', memory=memory)
+    yield ('build_prefix_sums', *timing)
+    _, *timing = measure(brand_sums.top, TOP_BRANDS, start_date, end_date, memory=memory)
+    yield ('rank_top_brands', *timing)
+
+    analyses = {
+        'brand_performance': lambda: brand_performance_table(SalesAggregates(cube, start_date, end_date), brands, stores),
+        'weekly_sales': lambda: weekly_sales_tables(filtered_cube, brands, brands),
+        'daily_sales': lambda: daily_sales_table(filtered_cube, brands),
+        'store_performance': lambda: store_performance_table(cube, query_cube(cube, start_date, end_date), brands, stores),
+        'hourly_sales': lambda: hourly_sales_tables(filtered_cube, brands),
+        'category_breakdown': lambda: category_breakdown_table(filtered_cube, brands),
+        'profit_margin': lambda: profit_margin_table(SalesAggregates(cube, start_date, end_date), brands, stores),
+        'top_products': lambda: top_products_table(filtered_data, brands),
+    }
+    for name, analysis in analyses.items():
+        _, *timing = measure(analysis, memory=memory)
+        yield (name, *timing)
+
+def measure(func, *args, memory=True, **kwargs):
+    # Wall time of an untraced run, then the peak traced allocation (numpy and
+    # pandas buffers included) of a second run; tracemalloc slows every
+    # allocation several times over, so it never runs while the clock does
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    if not memory:
+        return result, seconds, None
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak_bytes
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading and analysis at several data sizes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="row counts to benchmark")
+    parser.add_argument('--data-dir', default='.cache/benchmarks', help="where generated CSVs are kept between runs")
+    parser.add_argument('--results', default='benchmarks/results.jsonl', help="JSON lines file results are appended to")
+    parser.add_argument('--label', help="name for this run (default: current git revision)")
+    parser.add_argument('--skip-memory', action='store_true', help="time only, without the traced run for peak memory")
+    args = parser.parse_args(argv)
+    run_suite(args.sizes, args.data_dir, args.results, args.label, memory=not args.skip_memory)
+
+if __name__ == '__main__':
+    main()
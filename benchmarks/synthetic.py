@@ -0,0 +1,95 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Synthetic sales exports in the CSV schema load_data expects. Brands, stores
+# and products are drawn with Zipf-like weights so a few of each dominate, as
+# in the real exports
+CSV_COLUMNS = ['orderDate', 'time', 'brandName', 'storeName', 'categoryName', 'productId',
+               'productName', 'sellingPrice', 'costPrice', 'quantity']
+CHUNK_ROWS = 1_000_000
+N_CATEGORIES = 40
+PRODUCTS_PER_BRAND = 25
+SKEW = 1.1
+
+def generate_csv(path, n_rows, n_brands=500, n_stores=50, n_days=90, start_date='2024-01-01', seed=0):
+    # Written in chunks so tens of millions of rows never sit in memory at once
+    rng = np.random.default_rng(seed)
+    catalog = make_catalog(rng, n_brands)
+    stores = np.array([f"Store {i:03d}" for i in range(n_stores)], dtype=object)
+    dates = pd.date_range(start_date, periods=n_days, freq='D').strftime('%d/%m/%Y').to_numpy(dtype=object)
+    times = time_strings()
+
+    with open(path, 'w', newline='') as out:
+        for chunk_start in range(0, n_rows, CHUNK_ROWS):
+            chunk_rows = min(CHUNK_ROWS, n_rows - chunk_start)
+            chunk = generate_chunk(rng, chunk_rows, catalog, stores, dates, times)
+            chunk.to_csv(out, index=False, header=chunk_start == 0)
+    return path
+
+def make_catalog(rng, n_brands):
+    # Each brand sells in one category and owns a fixed block of products
+    n_products = n_brands * PRODUCTS_PER_BRAND
+    brand_index = np.repeat(np.arange(n_brands), PRODUCTS_PER_BRAND)
+    brand_category = rng.integers(0, N_CATEGORIES, n_brands)
+    selling_price = np.round(rng.lognormal(mean=5, sigma=0.8, size=n_products), 2)
+    return pd.DataFrame({
+        'brandName': np.array([f"Brand {i:04d}" for i in range(n_brands)], dtype=object)[brand_index],
+        'categoryName': np.array([f"Category {i:02d}" for i in range(N_CATEGORIES)], dtype=object)[brand_category[brand_index]],
+        'productId': np.arange(100_000, 100_000 + n_products),
+        'productName': np.array([f"Product {i}" for i in range(n_products)], dtype=object),
+        'sellingPrice': selling_price,
+        'costPrice': np.round(selling_price * rng.uniform(0.6, 0.9, n_products), 2),
+        'brand_weight': zipf_weights(n_brands)[brand_index] / PRODUCTS_PER_BRAND,
+    })
+
+def generate_chunk(rng, n_rows, catalog, stores, dates, times):
+    product_weights = catalog['brand_weight'].to_numpy()
+    products = catalog.iloc[rng.choice(len(catalog), n_rows, p=product_weights / product_weights.sum())]
+
+    # Store hours: most sales between late morning and evening
+    seconds = np.clip(rng.normal(15.5 * 3600, 3 * 3600, n_rows), 0, 86399).astype(np.int64)
+    time_format = rng.integers(0, len(times), n_rows)
+
+    chunk = pd.DataFrame({
+        'orderDate': dates[rng.integers(0, len(dates), n_rows)],
+        'time': np.choose(time_format, [time_col[seconds] for time_col in times]),
+        'brandName': products['brandName'].to_numpy(),
+        'storeName': stores[rng.choice(len(stores), n_rows, p=zipf_weights(len(stores)))],
+        'categoryName': products['categoryName'].to_numpy(),
+        'productId': products['productId'].to_numpy(),
+        'productName': products['productName'].to_numpy(),
+        'sellingPrice': products['sellingPrice'].to_numpy(),
+        'costPrice': products['costPrice'].to_numpy(),
+        'quantity': rng.geometric(0.6, n_rows),
+    })
+    return chunk[CSV_COLUMNS]
+
+def time_strings():
+    # Every second of the day in each of the three formats parse_time_dynamic accepts
+    seconds = np.arange(86400)
+    clock = pd.to_datetime(seconds, unit='s')
+    return [
+        (clock.strftime('%H:%M:%S') + '.' + pd.Index(seconds % 1000).astype(str).str.zfill(3) + 'Z').to_numpy(dtype=object),
+        clock.strftime('%H:%M:%S').to_numpy(dtype=object),
+        clock.strftime('%H:%M').to_numpy(dtype=object),
+    ]
+
+def zipf_weights(n):
+    weights = 1.0 / np.arange(1, n + 1) ** SKEW
+    return weights / weights.sum()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic sales CSV export.")
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--brands', type=int, default=500)
+    parser.add_argument('--stores', type=int, default=50)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    generate_csv(args.path, args.rows, args.brands, args.stores, args.days, seed=args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# Marks the repository root for pytest, which then puts it on sys.path so the
+# tests import utils, analysis and the scripts the same way the app does
@@ -1,6 +1,22 @@
+import os
+
 import streamlit as st
 import pandas as pd
-from utils.data_loader import load_data
+from utils.upload_cache import load_cached_upload
+from utils.data_loader import (
+    CUBE_SOURCE_COLUMNS,
+    PRODUCT_COLUMNS,
+    append_data,
+    dataset_date_range,
+    dataset_version,
+    load_dataset,
+)
+from utils.filters import filter_rows
+from utils.cube import build_cube, query_cube
+from utils.aggregates import SalesAggregates
+from utils.prefix_sums import DailyPrefixSums
+from utils.instrumentation import RerunProfiler, metrics_output_enabled
+from utils.sections import section_scope
 from analysis.weekly_sales import weekly_sales_analysis
 from analysis.store_performance_analysis import store_performance_analysis
 from analysis.hourly_sales import hourly_sales_analysis
@@ -11,101 +27,178 @@ from analysis.brand_comparison import brand_comparison_analysis
 from analysis.brand_performance_analysis import brand_performance_analysis
 from analysis.daily_sales_analysis import daily_sales_analysis
 
+# Sections of the dashboard; only the one picked in the section selector runs
+SECTIONS = ['Brand Performance', 'Weekly Sales', 'Daily Sales', 'Store Performance',
+            'Hourly Sales', 'Category Breakdown', 'Profit Analysis', 'Top Products']
+
+# Where the data comes from: a single uploaded CSV, or a window of the saved
+# dataset that daily uploads are appended to
+DATA_SOURCES = ['Upload CSV', 'Saved dataset']
+DATASET_DEFAULT_DAYS = 31
+# Loaded dataset windows kept in the cache, shared by every session
+DATASET_CACHE_ENTRIES = int(os.environ.get('TNS_DATASET_CACHE_ENTRIES', 2))
+DATASET_CACHE_TTL = int(os.environ.get('TNS_DATASET_CACHE_TTL', 3600))
+
 # Page configuration
 st.set_page_config(page_title="Brand Analysis Dashboard", layout="wide")
 
-# Load and preprocess data
+# Load and preprocess data, reusing the on-disk cache of previously parsed uploads
 @st.cache_data
 def load_optimized_data(file):
-    return load_data(file)
+    return load_cached_upload(file)
 
-# Cache filtered data with date range and store filter
-@st.cache_data
-def filter_data(_data, brands, stores, start_date, end_date):
-    if start_date is not None:
-        start_date = pd.to_datetime(start_date, utc=True)
-    if end_date is not None:
-        end_date = pd.to_datetime(end_date, utc=True)
+# Load the persisted base dataset, or the partitions of a date window of it with
+# the given columns; the version changes whenever a delta is appended. Each
+# window is a full frame, so only a few are kept
+@st.cache_data(max_entries=DATASET_CACHE_ENTRIES, ttl=DATASET_CACHE_TTL)
+def load_saved_dataset(version, start_date=None, end_date=None, columns=None):
+    return load_dataset(start_date=start_date, end_date=end_date, columns=list(columns) if columns else None)
 
-    _data['orderDate'] = pd.to_datetime(_data['orderDate'], utc=True)
-    
-    # Filter data based on selected date range, brands, and stores
-    mask = (_data['orderDate'] >= start_date) & (_data['orderDate'] <= end_date) & \
-           (_data['brandName'].isin(brands)) & (_data['storeName'].isin(stores))
-    filtered_data = _data[mask]
-    
-    return filtered_data
+# Keep a newly loaded frame along with its cube and running totals; the version
+# identifies the loaded data to every cache keyed on it
+def set_loaded_data(data, load_key, columns=None):
+    st.session_state.data = data
+    # Pre-aggregate once per load; the sections query this instead of raw rows
+    st.session_state.cube = build_cube(data)
+    # Running daily totals per brand and store for ranking any date window
+    st.session_state.brand_sums = DailyPrefixSums(st.session_state.cube, 'brandName')
+    st.session_state.store_sums = DailyPrefixSums(st.session_state.cube, 'storeName')
+    st.session_state.data_version += 1
+    st.session_state.last_upload = load_key
+    st.session_state.loaded_columns = columns
 
-# Add this after your existing filter_data function
-@st.cache_data
-def filter_data_by_date(_data, start_date, end_date):
-    if start_date is not None:
-        start_date = pd.to_datetime(start_date, utc=True)
-    if end_date is not None:
-        end_date = pd.to_datetime(end_date, utc=True)
+# First day of the window the saved dataset opens on: the last
+# DATASET_DEFAULT_DAYS days stored
+def default_window_start(first_day, last_day):
+    return max(first_day, last_day - pd.Timedelta(days=DATASET_DEFAULT_DAYS - 1)).date()
 
-    _data['orderDate'] = pd.to_datetime(_data['orderDate'], utc=True)
-    
-    # Filter data based on selected date range only
-    mask = (_data['orderDate'] >= start_date) & (_data['orderDate'] <= end_date)
-    date_filtered_data = _data[mask]
-    
-    # Aggregate by brands
-    brand_aggregated = date_filtered_data.groupby('brandName').agg(
-        total_sales=('sellingPrice', lambda x: (x * date_filtered_data.loc[x.index, 'quantity']).sum()),
-        total_cost=('costPrice', lambda x: (x * date_filtered_data.loc[x.index, 'quantity']).sum()),
-        total_quantity=('quantity', 'sum')
-    ).reset_index()
-    
-    brand_aggregated['profit'] = brand_aggregated['total_sales'] - brand_aggregated['total_cost']
-    brand_aggregated['profit_margin'] = (brand_aggregated['profit'] / brand_aggregated['total_sales']) * 100
-    
-    return date_filtered_data, brand_aggregated
+# After an append, open the default window of the dataset with the columns the
+# sections need, as the saved-dataset mode would, rather than all of history
+def open_appended_dataset(load_key, columns):
+    first_day, last_day = dataset_date_range()
+    if first_day is None:
+        return False
+    window_data = load_saved_dataset(dataset_version(), default_window_start(first_day, last_day), last_day.date(), columns)
+    if window_data is None:
+        return False
+    set_loaded_data(window_data, load_key, columns)
+    return True
 
+# Filtered rows for the last selection, kept in the session: the data version
+# only identifies a load within this session, so it cannot key a shared cache
+def filter_data(data, brands, stores, start_date, end_date):
+    key = (st.session_state.data_version, tuple(brands), tuple(stores), start_date, end_date)
+    memo = st.session_state.get('filtered_data')
+    if memo is None or memo[0] != key:
+        memo = (key, filter_rows(data, brands, stores, start_date, end_date))
+        st.session_state.filtered_data = memo
+    return memo[1]
 
-# Cache brand list
-@st.cache_data
-def get_top_brands(data, n=10):
-    return data['brandName'].value_counts().head(n).index.tolist()
-
-# Cache store list
-@st.cache_data
-def get_top_stores(data, n=10):
-    return data['storeName'].value_counts().head(n).index.tolist()
 
 # Initialize session state
 if 'data' not in st.session_state:
     st.session_state.data = None
+    st.session_state.cube = None
+    st.session_state.brand_sums = None
+    st.session_state.store_sums = None
+    st.session_state.data_version = 0
     st.session_state.last_upload = None
+    st.session_state.loaded_columns = None
 
 # Sidebar layout
 with st.sidebar:
-    uploaded_file = st.file_uploader("Upload CSV file", type="csv")
-    
-    if uploaded_file:
-        if st.session_state.last_upload != uploaded_file.name:
-            with st.spinner('Loading data...'):
-                st.session_state.data = load_optimized_data(uploaded_file)
-                st.session_state.last_upload = uploaded_file.name
-            st.success("Data loaded successfully!")
-        
+    data_source = st.radio("Data source", DATA_SOURCES, horizontal=True, key="data_source")
+    data_loaded = False
+    # Columns the sections need from the saved dataset; Top Products also needs the product columns
+    columns = tuple(CUBE_SOURCE_COLUMNS + (PRODUCT_COLUMNS if st.session_state.get('section') == 'Top Products' else []))
+    loaded_columns = st.session_state.loaded_columns or ()
+
+    if data_source == 'Upload CSV':
+        uploaded_file = st.file_uploader("Upload CSV file", type="csv")
+        append_mode = st.checkbox("Append upload to saved dataset", value=False, key="append_mode")
+
+        if uploaded_file:
+            upload_key = (uploaded_file.name, append_mode)
+            if st.session_state.last_upload != upload_key:
+                with st.spinner('Loading data...'):
+                    if append_mode:
+                        # Parse only the new file and merge it into the persisted dataset
+                        appended, duplicates = append_data(uploaded_file)
+                        open_appended_dataset(upload_key, columns)
+                        st.info(f"Appended {appended:,} new rows, skipped {duplicates:,} duplicates.")
+                    else:
+                        set_loaded_data(load_optimized_data(uploaded_file), upload_key)
+                if st.session_state.last_upload == upload_key:
+                    st.success("Data loaded successfully!")
+            elif append_mode and not set(columns) <= set(loaded_columns):
+                with st.spinner('Loading data...'):
+                    open_appended_dataset(upload_key, columns)
+            data_loaded = st.session_state.last_upload == upload_key
+            if not data_loaded:
+                st.warning("The saved dataset has no sales to show yet.")
+    else:
+        first_day, last_day = dataset_date_range()
+        if first_day is None:
+            st.info("No saved dataset yet. Append an upload to start one.")
+        else:
+            # The analysis window is also the load window: only the months and
+            # days overlapping it are read from disk, and only the columns the
+            # selected section needs, so opening the app costs the window rather
+            # than all of history
+            col1, col2 = st.columns(2)
+            with col1:
+                load_start = st.date_input("Start Date", default_window_start(first_day, last_day),
+                                           min_value=first_day, max_value=last_day, key="dataset_start")
+            with col2:
+                load_end = st.date_input("End Date", last_day, min_value=first_day, max_value=last_day, key="dataset_end")
+
+            # Reload when the window or the dataset changes, or when a section needs
+            # columns the loaded frame lacks
+            dataset_key = ('dataset', dataset_version(), load_start, load_end)
+            if st.session_state.last_upload != dataset_key or not set(columns) <= set(loaded_columns):
+                with st.spinner('Loading data...'):
+                    window_data = load_saved_dataset(*dataset_key[1:], columns)
+                if window_data is None:
+                    st.warning("The saved dataset has no sales in this window.")
+                else:
+                    set_loaded_data(window_data, dataset_key, columns)
+            data_loaded = st.session_state.last_upload == dataset_key
+
+    if data_loaded:
         data = st.session_state.data
-        
-        min_date = data['orderDate'].min()
-        max_date = data['orderDate'].max()
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input("Start Date", min_date)
-        with col2:
-            end_date = st.date_input("End Date", max_date)
+        cube = st.session_state.cube
+        brand_sums = st.session_state.brand_sums
+        store_sums = st.session_state.store_sums
+
+        unparsed_times = data.attrs.get('unparsed_times', 0)
+        if unparsed_times:
+            st.warning(f"{unparsed_times:,} rows have a time that could not be parsed.")
+
+        # Memory footprint of the loaded data before and after the compact schema
+        memory_before = data.attrs.get('memory_before')
+        memory_after = data.attrs.get('memory_after')
+        if memory_before and memory_after:
+            st.caption(f"Memory: {memory_before / 2**20:,.1f} MB → {memory_after / 2**20:,.1f} MB")
+        st.caption(f"Sales cube: {len(cube):,} cells from {cube.attrs['source_rows']:,} rows")
+
+        if data_source == 'Saved dataset':
+            # The window picked above was loaded as a whole
+            start_date, end_date = load_start, load_end
+        else:
+            min_date = data['orderDate'].min()
+            max_date = data['orderDate'].max()
+
+            col1, col2 = st.columns(2)
+            with col1:
+                start_date = st.date_input("Start Date", min_date)
+            with col2:
+                end_date = st.date_input("End Date", max_date)
         
         start_date = pd.to_datetime(start_date)
         end_date = pd.to_datetime(end_date)
         
-        # Get the number of unique brands in the data
-        unique_brands = data['brandName'].unique()
-        n_brands_available = len(unique_brands)
+        # Get the number of brands with sales in the data
+        n_brands_available = max(len(brand_sums.present()), 1)
 
         # Slider to select top N brands, affecting all analyses by default
         n_brands = st.number_input(
@@ -116,8 +209,8 @@ with st.sidebar:
             step=1
         )
  
-        # Get top brands based on the selected N
-        top_brands = get_top_brands(data, n=n_brands)
+        # Top N brands by order lines within the chosen dates
+        top_brands = brand_sums.top(n_brands, start_date, end_date)
         
         # Multiselect for narrowing down to specific brands within the top N brands
         selected_brands_sidebar = st.multiselect(
@@ -125,12 +218,8 @@ with st.sidebar:
             options=top_brands
         )
         
-        # Get the number of unique stores in the data
-        unique_stores = data['storeName'].unique()
-        n_stores_available = len(unique_stores)
-
-        # Get top stores based on the selected N (for store filter)
-        top_stores = get_top_stores(data, n=n_stores_available)
+        # Stores with sales within the chosen dates, busiest first (for store filter)
+        top_stores = store_sums.top(len(store_sums.labels), start_date, end_date)
         
         # Multiselect for narrowing down to specific stores within the top N stores
         selected_stores_sidebar = st.multiselect(
@@ -139,40 +228,72 @@ with st.sidebar:
         )
 
 # Ensure that top_brands, selected_brands_sidebar, top_stores, and selected_stores_sidebar are defined before using them
-if uploaded_file:
+if data_loaded:
     # Use selected brands and stores from the sidebar if any are chosen, otherwise default to top brands and stores
     selected_brands = selected_brands_sidebar if selected_brands_sidebar else top_brands
     selected_stores = selected_stores_sidebar if selected_stores_sidebar else top_stores
     
 
-    # Filter data based on selected brands, stores, and date range
-    filtered_data = filter_data(data, selected_brands, selected_stores, start_date, end_date)
+    # Filter the cube on selected brands, stores, and date range. Only the
+    # product-level section needs raw rows, so those are filtered when it runs
+    filtered_cube = query_cube(cube, start_date, end_date, brands=selected_brands, stores=selected_stores)
+    n_rows = int(filtered_cube['row_count'].sum())
     
-    date_filtered_data, brand_aggregated = filter_data_by_date(data, start_date, end_date)
+    date_filtered_cube = query_cube(cube, start_date, end_date)
+
+    # Per-rerun memo of cube roll-ups, so sections asking for the same totals share one computation
+    aggregates = SalesAggregates(cube, start_date, end_date)
+
+    st.sidebar.markdown(f"**Data points:** {n_rows:,}")
+
+    # Per-section timing, payload and memory; recorded only when someone will look at it
+    show_debug_panel = st.sidebar.checkbox("Show performance debug panel", value=False, key="debug_panel")
+    # Memory tracing is process-wide and slows every allocation, so it is opt-in
+    # and taken by one session at a time
+    trace_memory = show_debug_panel and st.sidebar.checkbox("Trace section memory", value=False, key="trace_memory")
+    profiler = RerunProfiler(enabled=show_debug_panel or metrics_output_enabled(), trace_memory=trace_memory)
 
-    st.sidebar.markdown(f"**Data points:** {len(filtered_data):,}")
+    # Everything a section's tables depend on; they are recomputed only when this changes
+    section_inputs = (st.session_state.data_version, start_date, end_date,
+                      tuple(selected_brands), tuple(selected_stores), tuple(top_brands))
     
     try:
         with st.spinner('Analyzing data...'):
-            if len(filtered_data) > 0:
-
-                overall_analysis = filtered_data.groupby('brandName').agg(
-                    total_sales=('sellingPrice', lambda x: (x * filtered_data.loc[x.index, 'quantity']).sum()),
-                    total_cost=('costPrice', lambda x: (x * filtered_data.loc[x.index, 'quantity']).sum()),
-                    total_quantity=('quantity', 'sum')
-                ).reset_index()
-
-                overall_analysis['profit'] = overall_analysis['total_sales'] - overall_analysis['total_cost']
-
-                # Run all analyses with filtered_data based on selected brands, stores, or top brands/stores by default
-                brand_performance_analysis(filtered_data, selected_brands, selected_stores)
-                weekly_sales_analysis(filtered_data, selected_brands, top_brands)
-                daily_sales_analysis(filtered_data, selected_brands, selected_stores)
-                store_performance_analysis(data, date_filtered_data, selected_brands, selected_stores)
-                hourly_sales_analysis(filtered_data, selected_brands)
-                category_breakdown_analysis(filtered_data, selected_brands)
-                profit_margin_analysis(filtered_data, selected_brands)
-                top_products_analysis(filtered_data, selected_brands)
+            if n_rows > 0:
+
+                selected_section = st.radio("Section", SECTIONS, horizontal=True, key="section")
+                sections = {
+                    'Brand Performance': ('brand_performance', len(filtered_cube),
+                                          lambda: brand_performance_analysis(aggregates, selected_brands, selected_stores)),
+                    'Weekly Sales': ('weekly_sales', len(filtered_cube),
+                                     lambda: weekly_sales_analysis(filtered_cube, selected_brands, top_brands)),
+                    'Daily Sales': ('daily_sales', len(filtered_cube),
+                                    lambda: daily_sales_analysis(filtered_cube, selected_brands, selected_stores)),
+                    'Store Performance': ('store_performance', len(cube),
+                                          lambda: store_performance_analysis(cube, date_filtered_cube, selected_brands, selected_stores)),
+                    'Hourly Sales': ('hourly_sales', len(filtered_cube),
+                                     lambda: hourly_sales_analysis(filtered_cube, selected_brands)),
+                    'Category Breakdown': ('category_breakdown', len(filtered_cube),
+                                           lambda: category_breakdown_analysis(filtered_cube, selected_brands)),
+                    'Profit Analysis': ('profit_margin', len(filtered_cube),
+                                        lambda: profit_margin_analysis(aggregates, selected_brands, selected_stores)),
+                    'Top Products': ('top_products', n_rows,
+                                     lambda: top_products_analysis(
+                                         filter_data(data, selected_brands, selected_stores, start_date, end_date),
+                                         selected_brands)),
+                }
+
+                # Run only the selected section with the filtered data
+                name, rows, run_section = sections[selected_section]
+                with profiler.section(name, rows), section_scope(name, section_inputs):
+                    run_section()
+
+                st.sidebar.caption(f"Aggregation cache: {aggregates.hits} hits, {aggregates.misses} misses")
+
+                profiler.write_outputs()
+                if show_debug_panel:
+                    st.sidebar.subheader("Section Performance")
+                    st.sidebar.dataframe(pd.DataFrame(profiler.sections).set_index('section'))
 
             else:
                 st.warning("No data found for the selected criteria.")
@@ -180,4 +301,4 @@ if uploaded_file:
         st.error(f"An error occurred during analysis: {str(e)}")
         st.exception(e)
 else:
-    st.warning("Please upload a CSV file to begin analysis.")
+    st.warning("Please upload a CSV file or open the saved dataset to begin analysis.")
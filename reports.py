@@ -0,0 +1,204 @@
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+from fpdf import FPDF
+from analysis.tables import (
+    brand_performance_table,
+    category_breakdown_table,
+    hourly_sales_tables,
+    store_performance_table,
+)
+from utils.aggregates import SalesAggregates
+from utils.cube import build_cube, query_cube
+from utils.data_loader import load_data, load_dataset, store_dir_name
+from utils.filters import category_mask
+from utils.stores import COORDINATES_PATH, StoreDimension
+
+# One PDF per store per month with the store performance, top brands, category
+# breakdown and hourly tables. Stores run on a process pool; each worker keeps
+# a single matplotlib figure and redraws it for every chart it needs
+PAGE_WIDTH = 190
+CHART_SIZE = (8, 3.5)
+
+# Chart renderer of the current worker process, created by init_renderer
+renderer = None
+
+class ChartRenderer:
+    def __init__(self, chart_root=None):
+        # PNGs go to a directory of this worker's own inside chart_root, which
+        # run_reports removes once the pool has shut down
+        self.figure = plt.figure(figsize=CHART_SIZE, dpi=100)
+        self.chart_dir = tempfile.mkdtemp(prefix='worker-', dir=chart_root)
+
+    def bar_chart(self, labels, values, title, name, horizontal=False):
+        self.figure.clf()
+        ax = self.figure.add_subplot()
+        labels = [str(label) for label in labels]
+        if horizontal:
+            ax.barh(labels[::-1], list(values)[::-1], color='#2E8B57')
+        else:
+            ax.bar(labels, list(values), color='#2E8B57')
+        ax.set_title(title)
+        ax.tick_params(labelsize=7)
+        self.figure.tight_layout()
+        path = os.path.join(self.chart_dir, f"{name}.png")
+        self.figure.savefig(path)
+        return path
+
+def init_renderer(chart_root=None):
+    global renderer
+    renderer = ChartRenderer(chart_root)
+
+def run_reports(data, out_dir='reports/pdf', stores=None, top_n=10, workers=None):
+    cube = build_cube(data)
+    if stores is None:
+        stores = report_stores(cube)
+    months = pd.PeriodIndex(cube['orderDate'].dropna().dt.to_period('M').unique()).sort_values()
+
+    written = {}
+    # Workers may not run exit handlers, so their chart files live under one
+    # temporary directory owned here and removed after the pool has finished
+    with tempfile.TemporaryDirectory(prefix='tns-charts-') as chart_root, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_renderer, initargs=(chart_root,)) as executor:
+        jobs = {
+            executor.submit(
+                store_reports,
+                store_name,
+                cube[category_mask(cube['storeName'], [store_name])],
+                months,
+                Path(out_dir) / store_dir_name(store_name),
+                top_n,
+            ): store_name
+            for store_name in stores
+        }
+        for job, store_name in jobs.items():
+            written[store_name] = job.result()
+    return written
+
+def report_stores(cube, coordinates_path=COORDINATES_PATH):
+    # Stores listed with map coordinates that also have sales in the data
+    listed = StoreDimension.from_csv(coordinates_path).names
+    present = set(cube['storeName'].dropna().unique())
+    return [store_name for store_name in listed if store_name in present]
+
+def store_reports(store_name, store_cube, months, store_dir, top_n=10):
+    paths = []
+    for month in months:
+        cells = query_cube(store_cube, month.start_time, month.end_time)
+        if cells.empty:
+            continue
+        paths.append(write_report(store_name, month, cells, store_dir / f"{month}.pdf", top_n))
+    return paths
+
+def write_report(store_name, month, cells, path, top_n=10):
+    brands = list(cells['brandName'].dropna().unique())
+    stores = [store_name]
+    aggregates = SalesAggregates(cells)
+
+    store_performance = store_performance_table(cells, cells, brands, stores)
+    top_brands = brand_performance_table(aggregates, brands, stores).head(top_n)
+    category_sales = category_breakdown_table(cells, brands)
+    hourly_sales = hourly_sales_tables(cells, brands)['total_hourly_sales']
+    hourly_sales = hourly_sales[hourly_sales['total_selling_price'] != 0]
+    daily_sales = cells.groupby(cells['orderDate'].dt.day)['total_selling_price'].sum()
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, pdf_text(f"{store_name} - {month.strftime('%B %Y')}"), ln=1, align='C')
+
+    section_title(pdf, "Store Performance")
+    pdf.image(renderer.bar_chart(daily_sales.index, daily_sales.to_numpy(), "Sales by Day of Month",
+                                 'store_performance'), w=PAGE_WIDTH)
+    write_table(pdf, store_performance, {
+        'total_selling_price': ('Sales', '{:,.2f}'),
+        'total_quantity': ('Quantity', '{:,.0f}'),
+        'profit': ('Profit', '{:,.2f}'),
+    })
+
+    section_title(pdf, f"Top {top_n} Brands")
+    pdf.image(renderer.bar_chart(top_brands['brandName'], top_brands['total_selling_price'], "Sales by Brand",
+                                 'top_brands', horizontal=True), w=PAGE_WIDTH)
+    write_table(pdf, top_brands, {
+        'brandName': ('Brand', '{}'),
+        'total_selling_price': ('Sales', '{:,.2f}'),
+        'profit': ('Profit', '{:,.2f}'),
+        'profit_margin': ('Margin', '{:.2f}%'),
+        'sales_contribution': ('Contribution', '{:.2f}%'),
+    })
+
+    section_title(pdf, "Category Breakdown")
+    pdf.image(renderer.bar_chart(category_sales['categoryName'].head(top_n), category_sales['total_sales'].head(top_n),
+                                 "Sales by Category", 'categories'), w=PAGE_WIDTH)
+    write_table(pdf, category_sales, {
+        'categoryName': ('Category', '{}'),
+        'total_sales': ('Sales', '{:,.2f}'),
+        'total_quantity': ('Quantity', '{:,.0f}'),
+        'profit': ('Profit', '{:,.2f}'),
+        'profit_margin': ('Margin', '{:.2f}%'),
+    })
+
+    section_title(pdf, "Hourly Sales")
+    pdf.image(renderer.bar_chart(hourly_sales['hour'], hourly_sales['total_selling_price'], "Sales by Hour",
+                                 'hourly'), w=PAGE_WIDTH)
+    write_table(pdf, hourly_sales, {
+        'hour': ('Hour', '{:.0f}'),
+        'total_selling_price': ('Sales', '{:,.2f}'),
+        'quantity': ('Quantity', '{:,.0f}'),
+    })
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf.output(str(path))
+    return path
+
+def section_title(pdf, title):
+    pdf.ln(4)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 8, pdf_text(title), ln=1)
+
+def write_table(pdf, table, columns):
+    # columns maps a table column to its header and format string
+    width = PAGE_WIDTH / len(columns)
+    pdf.set_font('Arial', 'B', 9)
+    for header, _ in columns.values():
+        pdf.cell(width, 6, pdf_text(header), border=1)
+    pdf.ln()
+    pdf.set_font('Arial', '', 8)
+    for row in table[list(columns)].itertuples(index=False):
+        for value, (_, value_format) in zip(row, columns.values()):
+            text = '' if pd.isna(value) else value_format.format(value)
+            pdf.cell(width, 5, pdf_text(text)[:40], border=1)
+        pdf.ln()
+
+def pdf_text(text):
+    # The built-in PDF fonts only cover Latin-1
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write one PDF report per store per month.")
+    parser.add_argument('source', nargs='?', help="sales CSV export; the persisted dataset is used when omitted")
+    parser.add_argument('--out', default='reports/pdf', help="output directory (default: reports/pdf)")
+    parser.add_argument('--store', action='append', dest='stores', help="limit to this store; may be repeated")
+    parser.add_argument('--top', type=int, default=10, dest='top_n', help="brands shown per report (default: 10)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    # From the persisted dataset only the given stores' partitions are read, when split by store
+    data = load_data(args.source) if args.source else load_dataset(stores=args.stores)
+    if data is None:
+        parser.error("no source CSV given and no persisted dataset found")
+
+    written = run_reports(data, args.out, args.stores, args.top_n, args.workers)
+    n_reports = sum(len(paths) for paths in written.values())
+    print(f"Wrote {n_reports} reports for {len(written)} stores to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from utils.data_loader import append_data, load_dataset, parse_time_column, parse_time_dynamic
+
+ROWS = [
+    {'orderDate': '01/03/2024', 'time': '10:15:00', 'storeName': 'Store A', 'brandName': 'Brand X',
+     'categoryName': 'Snacks', 'productName': 'Chips', 'productId': 11, 'sellingPrice': 20.5, 'costPrice': 15.0, 'quantity': 2},
+    {'orderDate': '01/03/2024', 'time': '11:40:00', 'storeName': 'Store B', 'brandName': 'Brand Y',
+     'categoryName': 'Drinks', 'productName': 'Cola', 'productId': 12, 'sellingPrice': 40.0, 'costPrice': 30.0, 'quantity': 1},
+]
+
+def write_csv(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+def test_rows_repeated_within_an_upload_are_separate_sales(tmp_path):
+    upload = write_csv(tmp_path / 'upload.csv', ROWS + ROWS[:1])
+    assert append_data(upload, tmp_path / 'dataset') == (3, 0)
+    # Uploading the same file again adds nothing, repeats included
+    assert append_data(upload, tmp_path / 'dataset') == (0, 3)
+    assert len(load_dataset(tmp_path / 'dataset')) == 3
+
+@pytest.mark.parametrize('new_row', [
+    # A missing id turns the productId column to float
+    {**ROWS[1], 'productId': None, 'time': '12:00:00'},
+    # A large id widens it from int8 to int16
+    {**ROWS[1], 'productId': 1_000, 'time': '12:00:00'},
+])
+def test_reuploaded_rows_match_whatever_dtypes_the_file_loads_with(tmp_path, new_row):
+    dataset = tmp_path / 'dataset'
+    assert append_data(write_csv(tmp_path / 'first.csv', ROWS), dataset) == (2, 0)
+    assert append_data(write_csv(tmp_path / 'second.csv', ROWS + [new_row]), dataset) == (1, 2)
+    assert len(load_dataset(dataset)) == 3
+
+TIMES = ['10:15:30.123Z', '23:59:59.999999Z', '10:15:30', '07:05', '1:2', '25:00', ' 10:15 ', '10:15:30Z', 'noon', None]
+
+def dynamic_time(value):
+    return None if pd.isna(value) else parse_time_dynamic(value)
+
+def as_times(times):
+    return [None if pd.isna(time) else time for time in times]
+
+@pytest.mark.parametrize('value', TIMES)
+def test_parse_time_column_matches_parse_time_dynamic(value):
+    # Each value both alone and among values that parse under the other formats
+    column = pd.Series([value, '08:30:00.5Z', '08:30:00', '08:30', value])
+    times, hours, minutes, unparsed_times = parse_time_column(column)
+
+    expected = [dynamic_time(row) for row in column]
+    assert as_times(times) == expected
+    assert hours.tolist() == [pd.NA if time is None else time.hour for time in expected]
+    assert minutes.tolist() == [pd.NA if time is None else time.minute for time in expected]
+    assert unparsed_times == sum(time is None for time in expected)
+
+def test_parse_time_column_handles_every_format_at_once():
+    column = pd.Series(TIMES * 3)
+    times, _, _, unparsed_times = parse_time_column(column)
+    assert as_times(times) == [dynamic_time(row) for row in column]
+    assert unparsed_times == sum(dynamic_time(row) is None for row in column)
+
+def test_load_dataset_reads_only_the_given_columns(tmp_path):
+    append_data(write_csv(tmp_path / 'upload.csv', ROWS), tmp_path / 'dataset')
+    data = load_dataset(tmp_path / 'dataset', columns=['orderDate', 'storeName', 'total_selling_price'])
+    assert set(data.columns) == {'orderDate', 'storeName', 'total_selling_price'}
+    assert len(data) == 2
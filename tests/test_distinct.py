@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.distinct import distinct_count, estimate_distinct, merge_sketches, value_sketches
+
+def sales(n_categories, rows_per_category=3, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = np.repeat([f"category-{i}" for i in range(n_categories)], rows_per_category)
+    return pd.DataFrame({
+        'brandName': rng.choice(['A', 'B'], size=len(categories)),
+        'categoryName': pd.Categorical(rng.permutation(categories)),
+    })
+
+@pytest.mark.parametrize('n_categories', [300, 1_500, 20_000])
+def test_approximate_matches_nunique(n_categories):
+    data = sales(n_categories)
+    exact = distinct_count(data, ['brandName'], 'categoryName', mode='exact')
+    approximate = distinct_count(data, ['brandName'], 'categoryName', mode='approximate')
+    assert np.all(np.abs(approximate - exact) <= 0.05 * exact)
+
+def test_approximate_hashes_plain_strings():
+    data = sales(1_500).astype({'categoryName': str})
+    exact = distinct_count(data, ['brandName'], 'categoryName', mode='exact')
+    approximate = distinct_count(data, ['brandName'], 'categoryName', mode='approximate')
+    assert np.all(np.abs(approximate - exact) <= 0.05 * exact)
+
+def test_missing_values_are_not_counted():
+    data = pd.DataFrame({'brandName': ['A'] * 4, 'categoryName': ['x', None, 'y', None]})
+    assert distinct_count(data, ['brandName'], 'categoryName', mode='approximate').tolist() == [2]
+
+def test_merged_halves_equal_whole():
+    data = sales(2_000)
+    groups = np.zeros(len(data), dtype=np.int64)
+    half = len(data) // 2
+    whole = value_sketches(groups, data['categoryName'])
+    merged = merge_sketches(value_sketches(groups[:half], data['categoryName'].iloc[:half]),
+                            value_sketches(groups[half:], data['categoryName'].iloc[half:]))
+    assert np.array_equal(whole[0], merged[0]) and np.array_equal(whole[1], merged[1])
+    assert estimate_distinct(merged, 1).tolist() == estimate_distinct(whole, 1).tolist()
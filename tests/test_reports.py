@@ -0,0 +1,11 @@
+from benchmarks.synthetic import generate_csv
+from reports import run_reports
+from utils.data_loader import load_data
+
+def test_run_reports_writes_one_pdf_per_store_and_month(tmp_path):
+    data = load_data(generate_csv(tmp_path / 'sales.csv', 2_000, n_brands=20, n_stores=3, n_days=40))
+    written = run_reports(data, tmp_path / 'pdf', stores=['Store 000', 'Store 001'], top_n=5, workers=1)
+    assert set(written) == {'Store 000', 'Store 001'}
+    for paths in written.values():
+        assert len(paths) == 2
+        assert all(path.exists() and path.stat().st_size > 0 for path in paths)
@@ -20,7 +20,7 @@ def top_n_brand_sales_analysis(store_data_filtered, all_data):
     chart_type = st.sidebar.selectbox("Select Chart Type:", ["Bar Chart", "Donut Chart", "Line Chart"], key="chart_type_selection")
 
     # Group sales by brandName for the selected store data
-    brand_sales = store_data_filtered.groupby('brandName').agg(
+    brand_sales = store_data_filtered.astype({'sellingPrice': 'float64', 'costPrice': 'float64'}).groupby('brandName', observed=True).agg(
         total_sales=('sellingPrice', 'sum'),
         total_quantity=('quantity', 'sum'),
         total_cost_price=('costPrice', 'sum')
@@ -41,7 +41,7 @@ def top_n_brand_sales_analysis(store_data_filtered, all_data):
     top_n_brands['% Contribution Profit'] = (top_n_brands['total_profit'] / total_profit_all) * 100
 
     # Calculate total sales for the overall dataset
-    overall_brand_sales = all_data.groupby('brandName').agg(
+    overall_brand_sales = all_data.astype({'sellingPrice': 'float64'}).groupby('brandName', observed=True).agg(
         total_sales=('sellingPrice', 'sum'),
         quantity=('quantity', 'sum')
     ).reset_index()
@@ -0,0 +1,27 @@
+from utils.cube import query_cube
+
+class SalesAggregates:
+    # Roll-ups of the sales cube over one date window, shared by every section
+    # in a rerun. Each (grouping, brand filter, store filter) combination is
+    # summed once; later requests for it are served from memory
+    def __init__(self, cube, start_date=None, end_date=None):
+        self.cube = cube
+        self.start_date = start_date
+        self.end_date = end_date
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def totals(self, by, brands=None, stores=None):
+        by = [by] if isinstance(by, str) else list(by)
+        key = (tuple(by), selection_key(brands), selection_key(stores))
+        if key in self.results:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.results[key] = query_cube(self.cube, self.start_date, self.end_date, brands=brands, stores=stores, by=by)
+        # Sections add derived columns to what they get back, so hand out copies
+        return self.results[key].copy()
+
+def selection_key(values):
+    return None if values is None else frozenset(values)
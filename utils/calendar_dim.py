@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Calendar dimension: one row per day, keyed by an integer date key (days since
+# 1970-01-01). Transactions carry only the key; their weekday, month and week
+# columns are gathered from the calendar instead of being derived row by row
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# Optional CSV with a 'date' column listing the holidays to flag
+HOLIDAYS_FILE = os.environ.get('TNS_HOLIDAYS_FILE')
+
+# English names used for the day and month columns; kept in sorted order as
+# categories so groupbys and sorts match the old string columns
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+
+def date_keys(dates):
+    # Days since the epoch as a nullable Int32; missing dates stay missing
+    days = pd.Series(dates).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    missing = np.isnat(days)
+    keys = np.where(missing, 0, (days - EPOCH).astype(np.int64)).astype(np.int32)
+    return pd.arrays.IntegerArray(keys, missing)
+
+def build_calendar(first_key, last_key, holidays=None):
+    # Every day from first_key to last_key inclusive, so a key's row is at
+    # position key - first_key
+    if holidays is None:
+        holidays = load_holidays()
+    keys = np.arange(first_key, last_key + 1, dtype=np.int64)
+    dates = pd.DatetimeIndex(EPOCH + keys.astype('timedelta64[D]'))
+    iso = dates.isocalendar()
+    return pd.DataFrame({
+        'date_key': pd.array(keys.astype(np.int32), dtype='Int32'),
+        'date': dates,
+        'year': pd.array(dates.year, dtype='Int16'),
+        'month': named_category(dates.month - 1, MONTH_NAMES),
+        'month_year': dates.to_period('M'),
+        'iso_year': pd.array(iso['year'].to_numpy(), dtype='Int16'),
+        'iso_week': pd.array(iso['week'].to_numpy(), dtype='Int8'),
+        'week_number': pd.array((dates.day - 1) // 7 + 1, dtype='Int8'),
+        'day': named_category(dates.dayofweek, WEEKDAY_NAMES),
+        'is_weekend': pd.array(dates.dayofweek >= 5, dtype='boolean'),
+        'is_holiday': pd.array(dates.isin(holidays), dtype='boolean'),
+    })
+
+def calendar_for(keys, holidays=None):
+    # Calendar covering every key in keys (an empty one when all are missing)
+    keys = pd.array(keys, dtype='Int32')
+    if keys.isna().all():
+        return build_calendar(0, -1, holidays)
+    return build_calendar(int(keys.min()), int(keys.max()), holidays)
+
+def calendar_lookup(calendar, keys, columns):
+    # Gather calendar columns for each key; keys outside the calendar or
+    # missing get missing values. All calendar columns are extension arrays,
+    # so a take with fill handles the misses for every dtype
+    first_key = int(calendar['date_key'].iloc[0]) if len(calendar) else 0
+    positions = pd.array(keys, dtype='Int32').to_numpy(dtype='float64', na_value=np.nan) - first_key
+    valid = ~np.isnan(positions) & (positions >= 0) & (positions < len(calendar))
+    positions = np.where(valid, positions, -1).astype(np.int64)
+    return {col: calendar[col].array.take(positions, allow_fill=True) for col in columns}
+
+def named_category(positions, names):
+    # Map 0-based positions in names to a categorical whose categories are the
+    # names in sorted order; missing positions become missing values
+    categories = sorted(names)
+    lookup = np.array([categories.index(name) for name in names])
+    positions = positions.to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~np.isnan(positions)
+    codes = np.full(len(positions), -1, dtype='int8')
+    codes[valid] = lookup[positions[valid].astype('int64')]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def load_holidays(path=HOLIDAYS_FILE):
+    if not path or not os.path.exists(path):
+        return pd.DatetimeIndex([])
+    return pd.DatetimeIndex(pd.to_datetime(pd.read_csv(path)['date'], errors='coerce').dropna()).normalize()
@@ -0,0 +1,130 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Limits on what a single chart sends to the browser: at most MAX_SERIES traces
+# (the smallest series are folded into an "Others" trace) and at most
+# MAX_POINTS points across all traces
+MAX_SERIES = int(os.environ.get('TNS_CHART_MAX_SERIES', 20))
+MAX_POINTS = int(os.environ.get('TNS_CHART_MAX_POINTS', 20_000))
+MAX_TICKS = 31
+OTHER_LABEL = 'Others'
+DAY_MS = 86_400_000
+
+# Above these sizes line charts switch to WebGL traces, and brand-wise charts
+# default to a heatmap that draws every brand in a single trace
+WEBGL_MIN_POINTS = int(os.environ.get('TNS_CHART_WEBGL_POINTS', 1_000))
+HEATMAP_MIN_SERIES = int(os.environ.get('TNS_CHART_HEATMAP_SERIES', MAX_SERIES))
+HEATMAP = 'Heatmap'
+
+def reduce_chart_frame(frame, x, y, series, max_series=MAX_SERIES, max_points=MAX_POINTS):
+    # Sits between an aggregated frame and px.*: keeps the largest series, then
+    # thins long numeric or date series so the whole chart fits the point cap
+    reduced = top_k_series(frame, x, y, series, max_series)
+    if x is None or len(reduced) <= max_points:
+        return reduced
+    if not (pd.api.types.is_numeric_dtype(reduced[x]) or pd.api.types.is_datetime64_any_dtype(reduced[x])):
+        return reduced
+    return downsample_series(reduced, x, y, series, max_points)
+
+def top_k_series(frame, x, y, series, k=MAX_SERIES, other_label=OTHER_LABEL):
+    totals = frame.groupby(series, observed=True)[y].sum()
+    if len(totals) <= k:
+        return frame
+
+    # Keep k - 1 series and sum the rest into one, so the chart has k traces
+    keep = totals.nlargest(k - 1).index
+    labels = frame[series].astype(object).where(frame[series].isin(keep), other_label)
+    keys = [series] if x is None else [x, series]
+    return (frame[[col for col in keys if col != series] + [y]]
+            .assign(**{series: labels})
+            .groupby(keys, observed=True, sort=False)[y].sum()
+            .reset_index())
+
+def downsample_series(frame, x, y, series, max_points=MAX_POINTS):
+    n_series = max(frame[series].nunique(), 1)
+    points_per_series = max(max_points // n_series, 3)
+    parts = []
+    for _, part in frame.groupby(series, observed=True, sort=False):
+        part = part.sort_values(x)
+        if len(part) > points_per_series:
+            x_values = part[x].to_numpy()
+            if np.issubdtype(x_values.dtype, np.datetime64):
+                x_values = x_values.astype('int64')
+            part = part.iloc[lttb_indices(x_values.astype('float64'), part[y].to_numpy(dtype='float64'), points_per_series)]
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from
+    # each bucket in between, the point forming the largest triangle with the
+    # previously kept point and the average of the next bucket
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def date_axis(dates, max_ticks=MAX_TICKS):
+    # One tick per day for short ranges, widening to whole multiples of a day
+    # so a long range never gets more than max_ticks labels
+    dates = pd.to_datetime(pd.Series(dates)).dropna()
+    n_days = (dates.max() - dates.min()).days + 1 if len(dates) else 1
+    step_days = max(math.ceil(n_days / max_ticks), 1)
+    return dict(tickmode='linear', tick0=dates.min() if len(dates) else None, dtick=step_days * DAY_MS, tickformat='%Y-%m-%d')
+
+def line_render_mode(frame):
+    return 'webgl' if len(frame) > WEBGL_MIN_POINTS else 'svg'
+
+def default_chart_index(chart_types, n_series, default=0):
+    if HEATMAP in chart_types and n_series > HEATMAP_MIN_SERIES:
+        return chart_types.index(HEATMAP)
+    return default
+
+def heatmap_figure(frame, x, y, series, title, labels=None):
+    grid = frame.pivot_table(index=series, columns=x, values=y, aggfunc='sum', fill_value=0, observed=True)
+    return grid_heatmap_figure(grid, title, labels)
+
+def grid_heatmap_figure(grid, title, labels=None, aggfunc='sum', row_totals=None):
+    # grid is already wide: one row per series and one column per x value.
+    # aggfunc combines the cells folded together by the caps, and row_totals
+    # ranks the rows when their sums do not (e.g. for percentages)
+    grid = reduce_heatmap_grid(grid, aggfunc=aggfunc, row_totals=row_totals)
+    fig = px.imshow(grid, aspect='auto', color_continuous_scale='Viridis', title=title, labels=labels)
+    fig.update_layout(height=min(max(400, 18 * len(grid)), 2400))
+    return fig
+
+def reduce_heatmap_grid(grid, max_series=MAX_SERIES, max_points=MAX_POINTS, aggfunc='sum', row_totals=None):
+    # The heatmap counterpart of reduce_chart_frame: keeps the max_series - 1
+    # largest rows and folds the rest into an "Others" row, then merges runs
+    # of consecutive columns so rows x columns fits the point cap. A merged
+    # column is labelled by its first x value
+    if len(grid) > max_series:
+        totals = (grid.sum(axis=1) if row_totals is None else pd.Series(row_totals)).reindex(grid.index)
+        keep = totals.nlargest(max_series - 1).index
+        rest = grid.drop(index=keep)
+        grid = pd.concat([grid.loc[keep], rest.agg(aggfunc).to_frame(OTHER_LABEL).T])
+
+    max_columns = max(max_points // max(len(grid), 1), 1)
+    if grid.shape[1] > max_columns:
+        width = math.ceil(grid.shape[1] / max_columns)
+        bins = np.arange(grid.shape[1]) // width
+        merged = grid.T.groupby(bins).agg(aggfunc).T
+        merged.columns = grid.columns[::width]
+        grid = merged
+    return grid
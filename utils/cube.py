@@ -0,0 +1,45 @@
+from utils.filters import date_range_slice, category_mask, sort_by_order_date
+
+# Grain of the pre-aggregated sales cube. The date-derived columns depend only on
+# orderDate, so keeping them as keys adds no rows but lets sections group on them
+CUBE_KEYS = ['orderDate', 'hour', 'storeName', 'brandName', 'categoryName']
+DATE_KEYS = ['date_key', 'day', 'month', 'month_year', 'week_number']
+
+# Additive measures; they keep the transaction column names so the analysis
+# sections aggregate a cube slice exactly as they would raw rows
+CUBE_MEASURES = ['total_selling_price', 'total_cost_price', 'quantity', 'row_count']
+
+def build_cube(data):
+    cube = aggregate_cube(data.assign(row_count=1))
+    cube.attrs['source_rows'] = len(data)
+    return cube
+
+def aggregate_cube(frame):
+    keys = CUBE_KEYS + [key for key in DATE_KEYS if key in frame.columns]
+    cube = (
+        frame.groupby(keys, observed=True, dropna=False, sort=False)
+        .agg(
+            total_selling_price=('total_selling_price', 'sum'),
+            total_cost_price=('total_cost_price', 'sum'),
+            quantity=('quantity', 'sum'),
+            row_count=('row_count', 'sum'),
+        )
+        .reset_index()
+    )
+    cube['row_count'] = cube['row_count'].astype('int32')
+    return sort_by_order_date(cube)
+
+def query_cube(cube, start_date=None, end_date=None, brands=None, stores=None, by=None):
+    # Slice the cube to a date window and brand/store selection, optionally
+    # rolling the measures up to the requested grouping
+    cells = date_range_slice(cube, start_date, end_date)
+    if brands is not None or stores is not None:
+        mask = True
+        if brands is not None:
+            mask = mask & category_mask(cells['brandName'], brands)
+        if stores is not None:
+            mask = mask & category_mask(cells['storeName'], stores)
+        cells = cells[mask]
+    if by is None:
+        return cells
+    return cells.groupby(by, observed=True)[CUBE_MEASURES].sum().reset_index()
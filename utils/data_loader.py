@@ -1,12 +1,325 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-import streamlit as st
+import pyarrow.parquet as pq
+from utils.calendar_dim import calendar_for, calendar_lookup, date_keys
+from utils.files import write_atomic
+from utils.filters import sort_by_order_date
+
+# Bumped whenever load_data changes the columns or dtypes it produces, so that
+# persisted copies of older loads are not mistaken for current ones
+SCHEMA_VERSION = 4
+
+# Time formats seen in the store exports, tried in this order
+TIME_FORMATS = ['%H:%M:%S.%fZ', '%H:%M:%S', '%H:%M']
+
+# Low-cardinality text columns stored as categoricals
+DIMENSION_COLUMNS = ['brandName', 'storeName', 'categoryName', 'productName']
+PRICE_COLUMNS = ['sellingPrice', 'costPrice']
+
+# Calendar attributes copied onto each row for the sections to group on
+CALENDAR_COLUMNS = ['day', 'month', 'month_year', 'week_number']
+
+# Persisted base dataset that daily exports are appended to, partitioned as
+# year=YYYY/month=MM/ with one part file per day; with TNS_DATASET_BY_STORE set,
+# each month is further split into store=<name>/ directories
+DATASET_DIR = os.environ.get('TNS_DATASET_DIR', 'data/sales')
+DATASET_BY_STORE = os.environ.get('TNS_DATASET_BY_STORE', '').lower() in ('1', 'true', 'yes')
+
+# Columns read from the dataset to build the sales cube, which every section but
+# Top Products works from; that one also needs the product columns
+CUBE_SOURCE_COLUMNS = ['orderDate', 'hour', 'storeName', 'brandName', 'categoryName', 'quantity',
+                       'total_selling_price', 'total_cost_price', 'date_key'] + CALENDAR_COLUMNS
+PRODUCT_COLUMNS = ['productId', 'productName', 'sellingPrice', 'costPrice']
+
+# Raw columns enrich_data derives from, also read from parts stored before it existed
+ENRICH_INPUTS = ['orderDate', 'sellingPrice', 'costPrice', 'quantity']
+
+# Columns that identify a transaction line; a re-uploaded row hashes to the same key
+ROW_KEY = ['orderDate', 'time', 'storeName', 'brandName', 'productId', 'sellingPrice', 'costPrice', 'quantity']
+KEY_NUMBERS = ['productId', 'sellingPrice', 'costPrice', 'quantity']
 
 def load_data(uploaded_file):
     data = pd.read_csv(uploaded_file)
     data['orderDate'] = pd.to_datetime(data['orderDate'], errors='coerce', dayfirst=True)
-    data['time'] = data['time'].apply(parse_time_dynamic)
+    data['time'], data['hour'], data['minute'], unparsed_times = parse_time_column(data['time'])
+    data.attrs['unparsed_times'] = unparsed_times
+    data.attrs['memory_before'] = memory_footprint(data)
+    data = optimize_dtypes(data)
+    data = enrich_data(data)
+    data = sort_by_order_date(data)
+    data.attrs['memory_after'] = memory_footprint(data)
+    return data
+
+def enrich_data(data):
+    # Derived columns the analysis sections group on, computed once per load.
+    # Line totals stay float64 so sums over millions of rows keep paisa precision
+    data['total_selling_price'] = data['sellingPrice'].astype('float64') * data['quantity']
+    data['total_cost_price'] = data['costPrice'].astype('float64') * data['quantity']
+
+    # Date attributes are looked up in a calendar of the loaded days through an
+    # integer date key rather than derived from every row
+    data['date_key'] = date_keys(data['orderDate'])
+    calendar = calendar_for(data['date_key'])
+    for col, values in calendar_lookup(calendar, data['date_key'], CALENDAR_COLUMNS).items():
+        data[col] = values
     return data
 
+def optimize_dtypes(data):
+    # Dictionary-encode the dimensions, narrow prices to float32 and quantity to
+    # the smallest integer type that holds it
+    for col in DIMENSION_COLUMNS:
+        if col in data.columns:
+            data[col] = to_stripped_category(data[col])
+    for col in PRICE_COLUMNS:
+        if col in data.columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce').astype('float32')
+    if 'quantity' in data.columns:
+        if pd.api.types.is_integer_dtype(data['quantity']):
+            data['quantity'] = pd.to_numeric(data['quantity'], downcast='integer')
+        else:
+            data['quantity'] = pd.to_numeric(data['quantity'], errors='coerce').astype('float32')
+    if 'productId' in data.columns and pd.api.types.is_integer_dtype(data['productId']):
+        data['productId'] = pd.to_numeric(data['productId'], downcast='integer')
+    return data
+
+def to_stripped_category(col):
+    col = col.astype('category')
+    categories = col.cat.categories
+    if categories.dtype != object:
+        return col
+
+    # Strip surrounding spaces on the categories rather than on every row, merging
+    # categories that only differed by whitespace
+    stripped = categories.str.strip()
+    if stripped.equals(categories):
+        return col
+    remap, uniques = pd.factorize(stripped)
+    old_codes = col.cat.codes.to_numpy()
+    codes = np.where(old_codes >= 0, remap[old_codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=col.index, name=col.name)
+
+def memory_footprint(data):
+    return int(data.memory_usage(deep=True).sum())
+
+def append_data(uploaded_file, dataset_dir=DATASET_DIR):
+    # Parse only the new file, then write its rows into per-day part files of the
+    # base dataset, skipping rows whose key is already stored for that day
+    delta = load_data(uploaded_file)
+    delta['row_key'] = row_keys(delta)
+
+    appended, duplicates = 0, 0
+    keys = [delta['orderDate'].dt.normalize()] + ([delta['storeName']] if DATASET_BY_STORE else [])
+    for key, day_rows in delta.groupby(keys, dropna=False, sort=False, observed=True):
+        day, store = (key[0], key[1]) if DATASET_BY_STORE else (key[0], None)
+        day_dir = partition_dir(dataset_dir, day, store)
+        day_label = 'undated' if pd.isna(day) else f"{day:%Y%m%d}"
+
+        existing_keys = read_row_keys(day_dir.glob(f"part-{day_label}-*.parquet"))
+        new_rows = day_rows[~day_rows['row_key'].isin(existing_keys)]
+        duplicates += len(day_rows) - len(new_rows)
+        if new_rows.empty:
+            continue
+
+        new_rows = new_rows.copy()
+        new_rows.attrs = {}
+        digest = hashlib.sha1(new_rows['row_key'].to_numpy().tobytes()).hexdigest()[:16]
+        write_part(new_rows, day_dir / f"part-{day_label}-{digest}.parquet")
+        appended += len(new_rows)
+
+    return appended, duplicates
+
+def load_dataset(dataset_dir=DATASET_DIR, start_date=None, end_date=None, stores=None, columns=None):
+    # Read only the partitions overlapping [start_date, end_date] (and the given
+    # stores, when the dataset is split by store), and only the given columns
+    paths = dataset_parts(dataset_dir, start_date, end_date, stores)
+    parts = [read_part(path, columns) for path in paths]
+    if not parts:
+        return None
+
+    data = sort_by_order_date(concat_frames(parts))
+    if columns is not None:
+        data = data[[col for col in data.columns if col in columns]]
+    # hour is missing exactly where the time could not be parsed
+    if 'hour' in data:
+        data.attrs['unparsed_times'] = int(data['hour'].isna().sum())
+    data.attrs['memory_after'] = memory_footprint(data)
+    return data
+
+def read_part(path, columns=None):
+    if columns is None:
+        part = pd.read_parquet(path)
+    else:
+        available = pq.read_schema(path).names
+        wanted = set(columns) if 'date_key' in available else set(columns) | set(ENRICH_INPUTS)
+        part = pd.read_parquet(path, columns=[col for col in available if col in wanted])
+
+    # Parts appended before the enrichment stage or the date key existed get their derived columns now
+    return part if 'date_key' in part else enrich_data(part)
+
+def dataset_parts(dataset_dir=DATASET_DIR, start_date=None, end_date=None, stores=None):
+    # Part files of the dataset. Months outside the window are skipped by their
+    # directory name and days by their file name, so nothing is opened here.
+    # Undated rows only belong to an unbounded window
+    root = Path(dataset_dir)
+    first_day = None if start_date is None else f"{pd.Timestamp(start_date):%Y%m%d}"
+    last_day = None if end_date is None else f"{pd.Timestamp(end_date):%Y%m%d}"
+
+    month_dirs = []
+    for month_dir in sorted(root.glob('year=*/month=*')):
+        month = partition_month(month_dir)
+        if month is None:
+            continue
+        if (first_day and month < first_day[:6]) or (last_day and month > last_day[:6]):
+            continue
+        month_dirs.append(month_dir)
+    if first_day is None and last_day is None:
+        month_dirs.append(root / 'undated')
+
+    parts = []
+    for month_dir in month_dirs:
+        for path in month_parts(month_dir, stores):
+            day = part_day(path)
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            parts.append(path)
+    return sorted(parts)
+
+def month_parts(month_dir, stores=None):
+    if stores is None:
+        return list(month_dir.glob('**/part-*.parquet'))
+    # Parts written without the store level hold every store and are always read
+    paths = list(month_dir.glob('part-*.parquet'))
+    for store in stores:
+        paths.extend((month_dir / f"store={store_dir_name(store)}").glob('part-*.parquet'))
+    return paths
+
+def partition_month(month_dir):
+    # 'YYYYMM' from a year=YYYY/month=MM directory, None for anything else
+    month = re.fullmatch(r'month=(\d{2})', month_dir.name)
+    year = re.fullmatch(r'year=(\d{4})', month_dir.parent.name)
+    if not (month and year):
+        return None
+    return year.group(1) + month.group(1)
+
+def part_day(path):
+    # part-YYYYMMDD-<digest>.parquet; 'undated' sorts after every date
+    return path.name.split('-')[1]
+
+def dataset_date_range(dataset_dir=DATASET_DIR):
+    # First and last day stored, from the part file names alone
+    days = sorted(day for day in (part_day(path) for path in dataset_listing(dataset_dir, dataset_signature(dataset_dir)))
+                  if day.isdigit())
+    if not days:
+        return None, None
+    return pd.Timestamp(days[0]), pd.Timestamp(days[-1])
+
+def dataset_version(dataset_dir=DATASET_DIR):
+    # Changes whenever a part file is added, so it can key Streamlit's cache
+    return dataset_signature(dataset_dir)
+
+def dataset_signature(dataset_dir=DATASET_DIR):
+    # Modification times of the dataset's directories. Parts are written with
+    # a rename into their directory, which updates its mtime, and new month or
+    # store directories update their parent's, so this changes with every
+    # append while only directories are stat'ed, never the part files
+    signature = []
+    pending = [str(dataset_dir)]
+    while pending:
+        path = pending.pop()
+        try:
+            signature.append((path, os.stat(path).st_mtime_ns))
+            with os.scandir(path) as entries:
+                pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except FileNotFoundError:
+            continue
+    return tuple(sorted(signature))
+
+@lru_cache(maxsize=8)
+def dataset_listing(dataset_dir, signature):
+    # Every part file, listed once per signature of the dataset directories
+    return tuple(dataset_parts(dataset_dir))
+
+def partition_dir(dataset_dir, day, store=None):
+    if pd.isna(day):
+        month_dir = Path(dataset_dir) / 'undated'
+    else:
+        month_dir = Path(dataset_dir) / f"year={day.year:04d}" / f"month={day.month:02d}"
+    if store is None:
+        return month_dir
+    return month_dir / f"store={store_dir_name(store)}"
+
+def store_dir_name(store_name):
+    # Directory name for a store, for dataset partitions and per-store outputs alike
+    if pd.isna(store_name):
+        return 'unknown'
+    return re.sub(r'[^\w-]+', '_', str(store_name)).strip('_') or 'store'
+
+def row_keys(data):
+    # Hash canonical dtypes rather than the loaded ones: optimize_dtypes picks
+    # int8, int16 or float32 depending on what else is in the file, and the
+    # same value hashes differently under each
+    key = pd.DataFrame({
+        col: (data[col].astype('datetime64[ns]') if col == 'orderDate'
+              else pd.to_numeric(data[col], errors='coerce').astype('float64') if col in KEY_NUMBERS
+              else data[col].astype(str).str.strip())
+        for col in ROW_KEY
+    })
+    content = pd.Series(pd.util.hash_pandas_object(key, index=False).to_numpy())
+
+    # Identical lines can be separate sales (there is no transaction id and
+    # times may only have minutes), so the n-th repeat of a line within a file
+    # gets its own key: a re-upload still matches line for line
+    occurrence = content.groupby(content, sort=False).cumcount()
+    return pd.util.hash_pandas_object(pd.DataFrame({'content': content, 'occurrence': occurrence}), index=False).to_numpy()
+
+def read_row_keys(paths):
+    keys = [pd.read_parquet(path, columns=['row_key'])['row_key'].to_numpy() for path in paths]
+    return np.concatenate(keys) if keys else np.array([], dtype='uint64')
+
+def write_part(data, path):
+    write_atomic(path, lambda tmp_path: data.to_parquet(tmp_path, index=False))
+
+def concat_frames(frames):
+    # Align categories first; concatenating categoricals with different
+    # categories would otherwise fall back to object columns
+    frames = [frame.copy(deep=False) for frame in frames]
+    for col in DIMENSION_COLUMNS:
+        if not all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames if col in frame):
+            continue
+        categories = pd.Index([])
+        for frame in frames:
+            if col in frame:
+                categories = categories.union(frame[col].cat.categories)
+        for frame in frames:
+            if col in frame:
+                frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+def parse_time_column(time_col):
+    # Parse the whole column one format at a time; each pass only sees the rows
+    # the earlier formats could not parse
+    parsed = pd.Series(pd.NaT, index=time_col.index, dtype='datetime64[ns]')
+    remaining = time_col.notna().to_numpy()
+    for time_format in TIME_FORMATS:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(time_col[remaining], format=time_format, errors='coerce')
+        parsed[remaining] = attempt
+        remaining &= parsed.isna().to_numpy()
+
+    valid = parsed.notna()
+    times = parsed.dt.time.where(valid, None)
+    hours = parsed.dt.hour.astype('Int8')
+    minutes = parsed.dt.minute.astype('Int8')
+    unparsed_times = int((~valid).sum())
+    return times, hours, minutes, unparsed_times
+
 def parse_time_dynamic(time_str):
     try:
         return pd.to_datetime(time_str, format='%H:%M:%S.%fZ').time()
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Distinct counts per group, exact or from mergeable HyperLogLog sketches. Each
+# value is hashed to 64 bits; the top PRECISION bits pick one of REGISTERS
+# registers and the register keeps the largest rank (leading zeros + 1) of the
+# remaining bits seen. Sketches of any rows merge with a register-wise max.
+# The standard error is about 1.04 / sqrt(REGISTERS), 1.6% at precision 12
+PRECISION = int(os.environ.get('TNS_DISTINCT_PRECISION', 12))
+REGISTERS = 1 << PRECISION
+RANK_BITS = 64 - PRECISION
+
+# 'exact', 'approximate', or 'auto' to count exactly up to EXACT_MAX_ROWS rows
+DISTINCT_MODE = os.environ.get('TNS_DISTINCT_MODE', 'auto')
+EXACT_MAX_ROWS = int(os.environ.get('TNS_DISTINCT_EXACT_ROWS', 200_000))
+
+def distinct_count(frame, keys, column, mode=DISTINCT_MODE):
+    # Distinct non-missing values of column for each group of keys, in the
+    # sorted group order of frame.groupby(keys, observed=True)
+    if mode == 'exact' or (mode == 'auto' and len(frame) <= EXACT_MAX_ROWS):
+        return frame.groupby(keys, observed=True)[column].nunique().to_numpy()
+
+    groups = frame.groupby(keys, observed=True).ngroup().to_numpy()
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    return estimate_distinct(value_sketches(groups, frame[column]), n_groups)
+
+def value_hashes(column):
+    # 64-bit hash of each value and whether it is present. A categorical's
+    # categories are hashed once and gathered by code
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        categories = pd.util.hash_pandas_object(pd.Series(column.cat.categories), index=False).to_numpy()
+        valid = codes >= 0
+        return categories[np.where(valid, codes, 0)] if len(categories) else np.zeros(len(codes), dtype=np.uint64), valid
+    valid = column.notna().to_numpy()
+    return pd.util.hash_pandas_object(column, index=False).to_numpy(), valid
+
+def value_sketches(groups, column):
+    # Sketches of the values of column for each group; missing values and rows
+    # outside any group (-1) are left out
+    hashes, valid = value_hashes(column)
+    valid &= groups >= 0
+    hashes = hashes[valid]
+    registers = (hashes >> np.uint64(RANK_BITS)).astype(np.int64)
+    remaining = hashes & np.uint64((1 << RANK_BITS) - 1)
+    ranks = (RANK_BITS - bit_length(remaining) + 1).astype(np.uint8)
+    return reduce_sketch(groups[valid].astype(np.int64), registers, ranks)
+
+def bit_length(values):
+    # Bits needed for each unsigned 64-bit value, by halving: float conversion
+    # would round values close to a power of two up to it
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        lengths[high] += shift
+        values[high] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+def reduce_sketch(groups, registers, ranks):
+    # A sketch is sparse: the (group, register, rank) of every register that
+    # was set, one entry per register with its largest rank. Sorting by
+    # (group, register) lets one reduceat keep the maximum of every register
+    keys = groups * REGISTERS + registers
+    if not len(keys):
+        return keys, ranks
+    order = np.argsort(keys, kind='stable')
+    keys, ranks = keys[order], ranks[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.maximum.reduceat(ranks, starts)
+
+def merge_sketches(*sketches):
+    # The sketch of the union of the rows behind each sketch
+    keys = np.concatenate([sketch[0] for sketch in sketches])
+    ranks = np.concatenate([sketch[1] for sketch in sketches])
+    return reduce_sketch(keys // REGISTERS, keys % REGISTERS, ranks)
+
+def estimate_distinct(sketch, n_groups):
+    # HyperLogLog estimate per group, with linear counting over the empty
+    # registers for small counts where the raw estimate is biased
+    keys, ranks = sketch
+    groups = keys // REGISTERS
+    filled = np.bincount(groups, minlength=n_groups)
+    empty = REGISTERS - filled
+    harmonic = empty + np.bincount(groups, weights=np.ldexp(1.0, -ranks.astype(np.int64)), minlength=n_groups)
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS ** 2 / harmonic
+    with np.errstate(divide='ignore'):
+        linear = REGISTERS * np.log(REGISTERS / np.maximum(empty, 1))
+    estimate = np.where((raw <= 2.5 * REGISTERS) & (empty > 0), linear, raw)
+    return np.rint(estimate).astype(np.int64)
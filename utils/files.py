@@ -0,0 +1,17 @@
+import os
+import threading
+from pathlib import Path
+
+def write_atomic(path, write):
+    # Write through a temporary name next to path, then rename it into place,
+    # so readers never see a half-written file. write is called with the
+    # temporary path; the name is unique per process and thread
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
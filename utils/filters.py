@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+def date_range_slice(data, start_date=None, end_date=None):
+    # Loaded data is kept sorted by orderDate (missing dates last), so a date
+    # window is one contiguous block located with two binary searches
+    if data.attrs.get('sorted_by') != 'orderDate':
+        mask = pd.Series(True, index=data.index)
+        if start_date is not None:
+            mask &= data['orderDate'] >= start_date
+        if end_date is not None:
+            mask &= data['orderDate'] <= end_date
+        return data[mask]
+
+    order_dates = data['orderDate'].to_numpy()
+    start = 0 if start_date is None else order_dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), side='left')
+    end = len(data) if end_date is None else order_dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), side='right')
+    return data.iloc[start:end]
+
+def filter_rows(data, brands, stores, start_date=None, end_date=None):
+    # Slice the selected date range out of the date-sorted data, then apply the
+    # brand and store filters to that slice only
+    date_filtered_data = date_range_slice(data, start_date, end_date)
+    mask = category_mask(date_filtered_data['brandName'], brands) & category_mask(date_filtered_data['storeName'], stores)
+    return date_filtered_data[mask]
+
+def sort_by_order_date(data):
+    data = data.sort_values('orderDate', kind='stable', na_position='last', ignore_index=True)
+    data.attrs['sorted_by'] = 'orderDate'
+    return data
+
+def category_mask(column, values):
+    # Brands and stores are categoricals, so a selection becomes a boolean lookup
+    # table indexed by category code and filtering is a single gather. The extra
+    # trailing False slot is what missing values (code -1) land on
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.isin(values).to_numpy()
+
+    categories = column.cat.categories
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    positions = categories.get_indexer(list(values))
+    lookup[positions[positions >= 0]] = True
+    return lookup[column.cat.codes.to_numpy()]
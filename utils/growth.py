@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from utils.hourly import group_codes
+
+# Period-over-period growth for many series at once. An aggregated long table
+# becomes a (series, period) matrix over a gap-free period range, and every
+# comparison is an array operation across all series; growth against a zero
+# or missing prior value is NaN, not 0
+PERIODS_PER_YEAR = {'W': 52, 'M': 12, 'Q': 4}
+ROLLING_WINDOW = 4
+
+def period_matrix(periods, series, values):
+    # periods is a column of pandas Periods of one frequency. Returns the labels
+    # of the series that have rows, the full PeriodIndex from first to last
+    # period and the summed values
+    periods = pd.PeriodIndex(periods)
+    codes, labels = group_codes(pd.Series(series))
+    valid = (codes >= 0) & ~periods.isna()
+    if not valid.any():
+        return np.asarray(labels)[:0], pd.PeriodIndex([], freq=periods.freq), np.zeros((0, 0))
+
+    ordinals = periods.asi8
+    first, last = ordinals[valid].min(), ordinals[valid].max()
+    n_periods = int(last - first + 1)
+    cells = codes[valid] * n_periods + (ordinals[valid] - first)
+    matrix = np.bincount(cells, weights=np.asarray(values, dtype='float64')[valid],
+                         minlength=len(labels) * n_periods).reshape(len(labels), n_periods)
+    index = pd.period_range(start=pd.Period(ordinal=first, freq=periods.freq), periods=n_periods)
+    present = np.bincount(codes[valid], minlength=len(labels)) > 0
+    return np.asarray(labels)[present], index, matrix[present]
+
+def growth_matrix(matrix, lag=1):
+    # Percentage change against the value lag periods earlier along each row
+    prior = shift_periods(matrix, lag)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prior != 0, (matrix - prior) / prior * 100, np.nan)
+
+def rolling_mean(matrix, window=ROLLING_WINDOW):
+    # Trailing mean over window periods from a cumulative sum; NaN until a
+    # full window is available
+    totals = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+    means = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        means[:, window - 1:] = (totals[:, window:] - totals[:, :-window]) / window
+    return means
+
+def shift_periods(matrix, lag):
+    shifted = np.full(matrix.shape, np.nan)
+    if 0 < lag < matrix.shape[1]:
+        shifted[:, lag:] = matrix[:, :-lag]
+    return shifted
+
+def growth_frame(periods, series, values, name, window=ROLLING_WINDOW):
+    # Long table of every series and period with the period value, growth on
+    # the previous period and on the same period a year earlier, and the
+    # change against the trailing average of the previous window periods
+    labels, index, matrix = period_matrix(periods, series, values)
+    lag_year = PERIODS_PER_YEAR.get(index.freqstr[0]) if len(index) else None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prior_average = shift_periods(rolling_mean(matrix, window), 1)
+        vs_average = np.where(prior_average != 0, (matrix - prior_average) / prior_average * 100, np.nan)
+
+    n_series, n_periods = matrix.shape
+    return pd.DataFrame({
+        name: np.repeat(labels, n_periods),
+        'period': np.tile(index.to_timestamp(), n_series),
+        'value': matrix.ravel(),
+        'growth': growth_matrix(matrix).ravel(),
+        'yoy_growth': (growth_matrix(matrix, lag_year) if lag_year else np.full(matrix.shape, np.nan)).ravel(),
+        'rolling_average': rolling_mean(matrix, window).ravel(),
+        'vs_rolling_average': vs_average.ravel(),
+    })
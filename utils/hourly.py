@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Hour-of-day aggregation without pivot tables: every row is mapped to a cell
+# code * 24 + hour once, and each measure is summed into the grid with a single
+# np.bincount over those cells
+HOURS = 24
+HOURLY_MEASURES = ['total_selling_price', 'total_cost_price', 'quantity']
+
+def hourly_grids(frame, groupings, measures=HOURLY_MEASURES, mask=None):
+    # Sums the measures into a (group, hour) grid for each grouping column, e.g.
+    # brandName, storeName or day. The hour column and the row mask are read
+    # once and shared by every grouping. Returns {grouping: (labels, present,
+    # {measure: grid})}, where present marks the groups that had any rows
+    hours = frame['hour'].to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~np.isnan(hours) & (hours >= 0) & (hours < HOURS)
+    if mask is not None:
+        valid &= mask
+    hours = hours[valid].astype(np.int64)
+    values = {measure: frame[measure].to_numpy(dtype='float64')[valid] for measure in measures}
+
+    grids = {}
+    for by in groupings:
+        codes, labels = group_codes(frame[by])
+        codes = codes[valid]
+        rows = codes >= 0
+        cells = codes[rows] * HOURS + hours[rows]
+        size = len(labels) * HOURS
+        present = np.bincount(codes[rows], minlength=len(labels)) > 0
+        grids[by] = (labels, present, {
+            measure: np.bincount(cells, weights=measure_values[rows], minlength=size).reshape(len(labels), HOURS)
+            for measure, measure_values in values.items()
+        })
+    return grids
+
+def group_codes(column):
+    # Integer codes with -1 for missing values; categoricals reuse their codes
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+    codes, labels = pd.factorize(column, sort=True)
+    return codes.astype(np.int64), labels
+
+def grid_frame(labels, present, grid, name):
+    # Wide table with one row per group that had sales and a column per hour
+    table = pd.DataFrame(grid[present], columns=range(HOURS))
+    table.insert(0, name, np.asarray(labels)[present])
+    return table
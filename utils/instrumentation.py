@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from utils.files import write_atomic
+
+# Optional outputs for the per-section metrics of each rerun: a JSON lines log
+# that grows by one line per section, and a Prometheus text file holding the
+# latest rerun for a node_exporter textfile collector to scrape
+METRICS_LOG = os.environ.get('TNS_METRICS_LOG')
+METRICS_PROM = os.environ.get('TNS_METRICS_PROM')
+
+# Streamlit runs every session's reruns on its own thread in one process, so
+# the profiler of the rerun in progress is kept per thread
+local = threading.local()
+
+# tracemalloc is process-wide and slows every allocation, so memory is traced
+# only on request and for one section of one session at a time
+memory_lock = threading.Lock()
+
+class RerunProfiler:
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.sections = []
+        self.record = None
+        self.measuring_seconds = 0.0
+
+    @contextmanager
+    def section(self, name, rows):
+        if not self.enabled:
+            yield
+            return
+
+        self.record = {
+            'section': name,
+            'rows': int(rows),
+            'compute_seconds': 0.0,
+            'figure_seconds': 0.0,
+            'render_seconds': 0.0,
+            'payload_bytes': 0,
+            'peak_memory_bytes': None,
+        }
+        self.measuring_seconds = 0.0
+        tracing = self.trace_memory and memory_lock.acquire(blocking=False)
+        if tracing:
+            tracemalloc.start()
+        local.profiler = self
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            local.profiler = None
+            if tracing:
+                _, self.record['peak_memory_bytes'] = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                memory_lock.release()
+
+            # Whatever is neither table computation nor rendering is spent
+            # building the figures and widgets
+            self.record['figure_seconds'] = max(
+                total - self.record['compute_seconds'] - self.record['render_seconds'] - self.measuring_seconds, 0.0)
+            self.record['total_seconds'] = total
+            self.sections.append(self.record)
+            self.record = None
+
+    def timed_render(self, render, obj, *args, **kwargs):
+        start = time.perf_counter()
+        self.record['payload_bytes'] += payload_size(obj)
+        self.measuring_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            return render(obj, *args, **kwargs)
+        finally:
+            self.record['render_seconds'] += time.perf_counter() - start
+
+    def write_outputs(self, log_path=METRICS_LOG, prom_path=METRICS_PROM):
+        if not self.sections:
+            return
+        if log_path:
+            rerun = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+            with open(log_path, 'a') as log:
+                for record in self.sections:
+                    log.write(json.dumps({'rerun': rerun, **record}) + '\n')
+        if prom_path:
+            write_prometheus(self.sections, prom_path)
+
+def active_profiler():
+    profiler = getattr(local, 'profiler', None)
+    return profiler if profiler is not None and profiler.record is not None else None
+
+def plotly_chart(fig, *args, **kwargs):
+    # st.plotly_chart, timed and counted for the section being profiled
+    profiler = active_profiler()
+    if profiler is None:
+        return st.plotly_chart(fig, *args, **kwargs)
+    return profiler.timed_render(st.plotly_chart, fig, *args, **kwargs)
+
+def dataframe(table, *args, **kwargs):
+    # st.dataframe, timed and counted for the section being profiled
+    profiler = active_profiler()
+    if profiler is None:
+        return st.dataframe(table, *args, **kwargs)
+    return profiler.timed_render(st.dataframe, table, *args, **kwargs)
+
+@contextmanager
+def timed(phase):
+    # Adds the time spent in the block to the current section's phase; a no-op
+    # when no section is being profiled
+    profiler = active_profiler()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profiler is not None and profiler.record is not None:
+            profiler.record[f"{phase}_seconds"] += time.perf_counter() - start
+
+def metrics_output_enabled():
+    return bool(METRICS_LOG or METRICS_PROM)
+
+def payload_size(obj):
+    # Approximate bytes sent to the browser: the figure JSON for charts and the
+    # Arrow buffers for tables (a Styler's data included), which is how
+    # Streamlit ships them
+    if hasattr(obj, 'to_plotly_json'):
+        return len(obj.to_json())
+    data = getattr(obj, 'data', obj)
+    if isinstance(data, pd.DataFrame):
+        try:
+            return pa.Table.from_pandas(data).nbytes
+        except (pa.ArrowException, TypeError, ValueError):
+            # Columns Arrow cannot type are sent by Streamlit as strings
+            return pa.Table.from_pandas(data.astype(str)).nbytes
+    return 0
+
+def write_prometheus(sections, prom_path):
+    lines = []
+    metrics = [
+        ('tns_section_seconds', 'Time spent in a dashboard section in the last rerun, by phase', None),
+        ('tns_section_payload_bytes', 'Chart JSON and Arrow table bytes sent by a section', 'payload_bytes'),
+        ('tns_section_input_rows', 'Rows or cube cells a section was given', 'rows'),
+        ('tns_section_peak_memory_bytes', 'Peak memory allocated while a section ran, when traced', 'peak_memory_bytes'),
+    ]
+    for metric, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for record in sections:
+            if field is None:
+                for phase in ['compute', 'figure', 'render']:
+                    lines.append(f'{metric}{{section="{record["section"]}",phase="{phase}"}} {record[f"{phase}_seconds"]:.6f}')
+            elif record[field] is not None:
+                lines.append(f'{metric}{{section="{record["section"]}"}} {record[field]}')
+
+    # Written atomically so the collector never reads a partial file
+    write_atomic(prom_path, lambda tmp_path: tmp_path.write_text('\n'.join(lines) + '\n'))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from utils.calendar_dim import EPOCH, date_keys
+from utils.hourly import group_codes
+
+# Running totals per brand or store and day, built once per load. The totals of
+# any date window are the running total at its last day minus the one before
+# its first day, so a window costs two column lookups and a subtraction
+PREFIX_MEASURES = ['total_selling_price', 'total_cost_price', 'quantity', 'row_count']
+
+class DailyPrefixSums:
+    def __init__(self, cube, by):
+        keys = cube['date_key'] if 'date_key' in cube.columns else date_keys(cube['orderDate'])
+        days = pd.array(keys, dtype='Int32').to_numpy(dtype='float64', na_value=np.nan)
+        codes, labels = group_codes(cube[by])
+        valid = (codes >= 0) & ~np.isnan(days)
+
+        self.by = by
+        self.labels = np.asarray(labels)
+        self.first_key = int(days[valid].min()) if valid.any() else 0
+        self.n_days = int(days[valid].max()) - self.first_key + 1 if valid.any() else 0
+
+        # One bincount per measure over (label, day) cells, then a running sum
+        # along the days with a leading zero column for windows starting on day 0
+        cells = codes[valid] * self.n_days + (days[valid].astype(np.int64) - self.first_key)
+        size = len(self.labels) * self.n_days
+        self.sums = {}
+        for measure in PREFIX_MEASURES:
+            if measure not in cube.columns:
+                continue
+            daily = np.bincount(cells, weights=cube[measure].to_numpy(dtype='float64')[valid], minlength=size)
+            running = np.zeros((len(self.labels), self.n_days + 1))
+            np.cumsum(daily.reshape(len(self.labels), self.n_days), axis=1, out=running[:, 1:])
+            self.sums[measure] = running
+
+    def day_index(self, date, after=False):
+        # Position in the running totals of the start of date's day, or of the
+        # end of it when after is set, clipped to the loaded range
+        key = int((np.datetime64(pd.Timestamp(date).normalize(), 'D') - EPOCH).astype(np.int64))
+        return min(max(key - self.first_key + int(after), 0), self.n_days)
+
+    def totals(self, start_date=None, end_date=None, measure='row_count'):
+        # Per-label totals of measure from start_date to end_date inclusive
+        running = self.sums[measure]
+        start = 0 if start_date is None or pd.isna(start_date) else self.day_index(start_date)
+        end = self.n_days if end_date is None or pd.isna(end_date) else self.day_index(end_date, after=True)
+        return running[:, max(end, start)] - running[:, start]
+
+    def top(self, n, start_date=None, end_date=None, measure='row_count'):
+        # Labels of the n largest totals in the window, largest first; labels
+        # with nothing in the window are left out
+        totals = self.totals(start_date, end_date, measure)
+        candidates = np.flatnonzero(totals > 0)
+        if n < len(candidates):
+            candidates = candidates[np.argpartition(-totals[candidates], n - 1)[:n]]
+        order = candidates[np.argsort(-totals[candidates], kind='stable')]
+        return self.labels[order].tolist()
+
+    def present(self):
+        # Labels with any rows at all
+        return self.labels[self.sums['row_count'][:, -1] > 0].tolist()
@@ -0,0 +1,45 @@
+import threading
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Section being rendered in this rerun and the key of the inputs it was given,
+# so sections can reuse their tables without having the key passed in. Each
+# session reruns on its own thread, so this is kept per thread
+local = threading.local()
+
+@contextmanager
+def section_scope(name, inputs):
+    local.section = (name, inputs)
+    try:
+        yield
+    finally:
+        local.section = None
+
+def current_scope():
+    # The (name, inputs) of the section being rendered, for fragments to pass
+    # to cached_tables: a fragment rerun runs outside section_scope
+    return getattr(local, 'section', None)
+
+def cached_tables(compute, part=None, scope=None):
+    # A section's tables are kept in the session and reused on later reruns
+    # until its inputs change, e.g. when switching back to a section. part
+    # keeps several tables of one section apart, such as one per chart option
+    current_section = scope or current_scope()
+    if current_section is None:
+        return compute()
+
+    name, inputs = current_section
+    key = name if part is None else (name, part)
+    results = st.session_state.setdefault('section_tables', {})
+    entry = results.get(key)
+    if entry is None or entry[0] != inputs:
+        entry = (inputs, compute())
+        results[key] = entry
+    # Sections format columns in place, so the stored tables are handed out as copies
+    return copy_tables(entry[1])
+
+def copy_tables(tables):
+    if isinstance(tables, dict):
+        return {name: table.copy() for name, table in tables.items()}
+    return None if tables is None else tables.copy()
@@ -0,0 +1,121 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# Store dimension: store coordinates with a grid index over latitude and
+# longitude for radius, nearest-store and region queries, and for clustering
+# map points once there are too many stores to draw one by one
+COORDINATES_PATH = 'gps_co_ordinates/co_ordinates.csv'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_DEGREES = float(os.environ.get('TNS_STORE_GRID_DEGREES', 0.5))
+MAX_MAP_POINTS = int(os.environ.get('TNS_MAP_MAX_POINTS', 200))
+
+class StoreDimension:
+    def __init__(self, coordinates, grid_degrees=GRID_DEGREES):
+        coordinates = (coordinates[['storeName', 'latitude', 'longitude']]
+                       .assign(storeName=coordinates['storeName'].astype(str).str.strip())
+                       .dropna(subset=['latitude', 'longitude'])
+                       .drop_duplicates('storeName')
+                       .reset_index(drop=True))
+        self.coordinates = coordinates
+        self.names = coordinates['storeName'].to_numpy()
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.latitude = coordinates['latitude'].to_numpy(dtype='float64')
+        self.longitude = coordinates['longitude'].to_numpy(dtype='float64')
+
+        # Grid index: the stores of each grid_degrees x grid_degrees cell
+        self.grid_degrees = grid_degrees
+        rows, cols = self.grid_cells(self.latitude, self.longitude)
+        self.grid = {cell: np.array(members) for cell, members in
+                     pd.Series(range(len(self.names))).groupby([rows, cols]).agg(list).items()}
+
+    @classmethod
+    def from_csv(cls, path=COORDINATES_PATH):
+        return cls(pd.read_csv(path))
+
+    def grid_cells(self, latitude, longitude):
+        return (np.floor(np.asarray(latitude) / self.grid_degrees).astype(np.int64),
+                np.floor(np.asarray(longitude) / self.grid_degrees).astype(np.int64))
+
+    def attach(self, table, name_column='storeName'):
+        # Add latitude and longitude to a table with a store column; stores
+        # without coordinates get NaN
+        positions = table[name_column].astype(str).str.strip().map(self.positions).to_numpy(dtype='float64', na_value=np.nan)
+        known = ~np.isnan(positions)
+        index = np.where(known, positions, 0).astype(np.int64)
+        return table.assign(latitude=np.where(known, self.latitude[index], np.nan),
+                            longitude=np.where(known, self.longitude[index], np.nan))
+
+    def within(self, latitude, longitude, km):
+        # Stores within km of a point, nearest first. Only the grid cells the
+        # radius can reach are searched
+        lat_span = km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_span, 90.0))), 1e-6)
+        lon_span = min(km / (KM_PER_DEGREE * cos_lat), 180.0)
+        (row_lo, row_hi), (col_lo, col_hi) = self.grid_cells([latitude - lat_span, latitude + lat_span],
+                                                            [longitude - lon_span, longitude + lon_span])
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self.grid):
+            candidates = np.arange(len(self.names))
+        else:
+            cells = [self.grid.get((row, col)) for row in range(row_lo, row_hi + 1) for col in range(col_lo, col_hi + 1)]
+            cells = [members for members in cells if members is not None]
+            candidates = np.concatenate(cells) if cells else np.array([], dtype=np.int64)
+
+        distances = haversine_km(latitude, longitude, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= km
+        return self.distance_frame(candidates[inside], distances[inside])
+
+    def nearest(self, latitude, longitude, k=1):
+        # The k stores nearest to a point: widen the search radius until it
+        # holds k stores, which then must include the k nearest
+        k = min(k, len(self.names))
+        km = self.grid_degrees * KM_PER_DEGREE
+        while True:
+            found = self.within(latitude, longitude, km)
+            if len(found) >= k or km >= math.pi * EARTH_RADIUS_KM:
+                return found.head(k)
+            km *= 2
+
+    def distance_frame(self, positions, distances):
+        order = np.argsort(distances, kind='stable')
+        return pd.DataFrame({
+            'storeName': self.names[positions[order]],
+            'latitude': self.latitude[positions[order]],
+            'longitude': self.longitude[positions[order]],
+            'distance_km': distances[order],
+        })
+
+    def region_rollup(self, table, value_columns, degrees=None):
+        # Sum value_columns over grid regions of degrees x degrees; table needs
+        # latitude and longitude (see attach)
+        degrees = degrees or self.grid_degrees
+        located = table.dropna(subset=['latitude', 'longitude'])
+        rows = np.floor(located['latitude'].to_numpy() / degrees).astype(np.int64)
+        cols = np.floor(located['longitude'].to_numpy() / degrees).astype(np.int64)
+        regions = located.assign(region_row=rows, region_col=cols).groupby(['region_row', 'region_col'])
+        rollup = regions[value_columns].sum()
+        rollup['latitude'] = regions['latitude'].mean()
+        rollup['longitude'] = regions['longitude'].mean()
+        rollup['store_count'] = regions.size()
+        return rollup.reset_index()
+
+    def cluster(self, table, value_columns, max_points=MAX_MAP_POINTS):
+        # One map point per store while they fit, otherwise one per region,
+        # doubling the region size until at most max_points remain
+        located = table.dropna(subset=['latitude', 'longitude'])
+        if len(located) <= max_points:
+            return located.assign(store_count=1)
+        degrees = self.grid_degrees
+        while True:
+            rollup = self.region_rollup(located, value_columns, degrees)
+            if len(rollup) <= max_points or degrees >= 180:
+                return rollup.assign(storeName=rollup['store_count'].map(lambda count: f"{count} stores"))
+            degrees *= 2
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
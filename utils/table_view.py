@@ -0,0 +1,49 @@
+import math
+import os
+
+import streamlit as st
+from utils.instrumentation import dataframe
+
+# Tables stay numeric and are sent to the browser one page at a time; number
+# formats are applied by the grid, not by turning columns into strings
+PAGE_SIZE = int(os.environ.get('TNS_TABLE_PAGE_SIZE', 100))
+MONEY = '%.2f'
+PERCENT = '%.2f%%'
+COUNT = '%d'
+
+def show_table(table, key, formats=None, color_columns=(), page_size=PAGE_SIZE, **dataframe_kwargs):
+    # formats maps a column to a printf-style format; color_columns are shown
+    # red when negative and green otherwise
+    formats = {col: fmt for col, fmt in (formats or {}).items() if col in table.columns}
+    n_rows = len(table)
+    n_pages = max(math.ceil(n_rows / page_size), 1)
+
+    page_rows = table
+    if n_pages > 1:
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1, step=1, key=f"{key}_page")
+        start = (page - 1) * page_size
+        end = min(start + page_size, n_rows)
+        with col2:
+            st.caption(f"Rows {start + 1:,}–{end:,} of {n_rows:,}")
+        page_rows = table.iloc[start:end]
+
+    column_config = {col: st.column_config.NumberColumn(format=fmt) for col, fmt in formats.items()}
+    color_columns = [col for col in color_columns if col in page_rows.columns]
+    if color_columns:
+        # Colouring needs a Styler; built for the visible page only
+        page_rows = (page_rows.style
+                     .map(sign_color, subset=color_columns)
+                     .format({col: printf_formatter(fmt) for col, fmt in formats.items()}, na_rep=''))
+
+    dataframe_kwargs.setdefault('use_container_width', True)
+    dataframe(page_rows, column_config=column_config, **dataframe_kwargs)
+
+def sign_color(value):
+    if isinstance(value, (int, float)) and value == value:
+        return 'color: red' if value < 0 else 'color: green'
+    return ''
+
+def printf_formatter(fmt):
+    return lambda value: fmt % value
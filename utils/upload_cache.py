@@ -0,0 +1,52 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import pandas as pd
+from utils.data_loader import SCHEMA_VERSION, load_data
+from utils.files import write_atomic
+
+# Parsed uploads are kept as Parquet files named after the SHA-256 of the CSV bytes
+CACHE_DIR = os.environ.get('TNS_CACHE_DIR', '.cache/uploads')
+CACHE_MAX_BYTES = int(os.environ.get('TNS_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+def load_cached_upload(uploaded_file, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    content = uploaded_file.getvalue()
+    digest = hashlib.sha256(content).hexdigest()
+    cache_path = Path(cache_dir) / f"{digest}-v{SCHEMA_VERSION}.parquet"
+
+    if cache_path.exists():
+        try:
+            data = pd.read_parquet(cache_path)
+            # Bump the modification time so eviction treats the entry as recently used
+            os.utime(cache_path)
+            return data
+        except (OSError, ValueError):
+            # A corrupt or partially written entry is rebuilt from the CSV below
+            cache_path.unlink(missing_ok=True)
+
+    data = load_data(io.BytesIO(content))
+    store_in_cache(data, cache_path)
+    evict_cache(cache_dir, max_bytes)
+    return data
+
+def store_in_cache(data, cache_path):
+    write_atomic(cache_path, lambda tmp_path: data.to_parquet(tmp_path, index=False))
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    for path in Path(cache_dir).glob('*.parquet'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    # Drop least recently used entries until the cache fits in its budget
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total_bytes -= size